@@ -0,0 +1,485 @@
+import argparse
+import asyncio
+import dataclasses
+import gc
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import bot
+from bot import CONFIG, SignatureVerifier, SignedPrice, iter_signed_prices
+from mock_server import MockStorkServer, MockStorkState, StubCognito, private_key_to_address, sign_price
+
+# 基准测试: 全部离线运行，使用本地生成的密钥签名合成数据
+
+def make_signed_prices(count: int, private_key: int = None) -> List[SignedPrice]:
+    private_key = private_key or random.randrange(1, bot._SECP256K1_N)
+    now_ns = time.time_ns()
+    prices = []
+    for i in range(count):
+        asset = f"ASSET{i}USD"
+        price = str(random.randrange(10 ** 18, 10 ** 24))
+        signed = sign_price(private_key, asset, now_ns, price)
+        signature = signed["signature"]
+        prices.append(SignedPrice(
+            asset=asset,
+            msg_hash=signed["msg_hash"],
+            price=price,
+            timestamp=now_ns / 1000000,
+            raw_timestamp=now_ns,
+            asset_id=asset,
+            publisher_key=signed["publisher_key"],
+            signature=(signature["r"], signature["s"], signature["v"])
+        ))
+    return prices
+
+def flip_hex(value: str) -> str:
+    return value[:-1] + ("0" if value[-1] != "0" else "1")
+
+def rehashed(original: SignedPrice, **changes) -> SignedPrice:
+    # 改动字段后按同样的布局重算消息哈希，只剩签名本身能发现篡改
+    changed = dataclasses.replace(original, **changes)
+    msg_hash = bot.price_message_hash(changed.publisher_key, changed.asset_id, changed.raw_timestamp, changed.price)
+    return dataclasses.replace(changed, msg_hash="0x" + msg_hash.hex())
+
+def tampered_prices(price: SignedPrice) -> Dict[str, Tuple[SignedPrice, Optional[bool]]]:
+    # 各改动一处: 签名对不上必须判定无效；只改消息哈希时重算结果不一致，只能判定为无法验证
+    r, s, v = price.signature
+    other_key = "0x" + private_key_to_address(random.randrange(1, bot._SECP256K1_N)).hex()
+    return {
+        "price": (rehashed(price, price=str(int(price.price) + 1)), False),
+        "msg_hash": (dataclasses.replace(price, msg_hash=flip_hex(price.msg_hash)), None),
+        "signature.s": (dataclasses.replace(price, signature=(r, flip_hex(s), v)), False),
+        "publisher_key": (rehashed(price, publisher_key=other_key), False)
+    }
+
+def check_rejections(verifier: SignatureVerifier, price: SignedPrice):
+    for field, (tampered, expected) in tampered_prices(price).items():
+        verdict = verifier.verify(tampered)
+        assert verdict is expected, f"篡改 {field} 后验签结果为 {verdict}，期望 {expected}"
+    print("篡改检查: price / signature.s / publisher_key 被拒绝，msg_hash 不一致判定为无法验证")
+
+def bench_verify(args):
+    print(f"生成 {args.count} 条签名数据...")
+    prices = make_signed_prices(args.count)
+    verify_config = {**CONFIG["verify"], "processes": args.processes, "parallel_threshold": 1}
+    verifier = SignatureVerifier(verify_config)
+    try:
+        start = time.perf_counter()
+        results = verifier.verify_batch(prices)
+        cold = time.perf_counter() - start
+        assert all(results), "签名验证结果与预期不符"
+        check_rejections(verifier, prices[0])
+
+        start = time.perf_counter()
+        verifier.verify_batch(prices)
+        warm = time.perf_counter() - start
+    finally:
+        verifier.close()
+    backend = "coincurve" if bot._coincurve is not None else "纯 Python"
+    print(f"后端: {backend}, 进程数: {args.processes}")
+    print(f"首次验证: {args.count / cold:,.0f} 次/秒 ({cold * 1000:.1f} ms)")
+    print(f"缓存命中: {args.count / max(warm, 1e-9):,.0f} 次/秒 ({warm * 1000:.1f} ms)")
+
+def make_payload(count: int, publishers: int) -> bytes:
+    # 结构与 /stork_signed_prices 一致，另附每个发布者的签名列表等验证用不到的字段
+    rng = random.Random(1)
+
+    def signature() -> Dict:
+        return {"r": f"0x{rng.getrandbits(256):064x}", "s": f"0x{rng.getrandbits(256):064x}", "v": "0x1b"}
+
+    data = {}
+    for i in range(count):
+        asset = f"ASSET{i}USD"
+        timestamp = 1700000000000000000 + i
+        data[asset] = {
+            "price": str(rng.randrange(10 ** 18, 10 ** 24)),
+            "asset_id": asset,
+            "publisher_key": f"0x{rng.getrandbits(160):040x}",
+            "timestamped_signature": {
+                "signature": signature(),
+                "timestamp": timestamp,
+                "msg_hash": f"0x{rng.getrandbits(256):064x}"
+            },
+            "signed_prices": [
+                {
+                    "publisher_key": f"0x{rng.getrandbits(160):040x}",
+                    "external_asset_id": asset,
+                    "price": str(rng.randrange(10 ** 18, 10 ** 24)),
+                    "timestamped_signature": {"signature": signature(), "timestamp": timestamp, "msg_hash": ""}
+                }
+                for _ in range(publishers)
+            ]
+        }
+    return json.dumps({"data": data}).encode()
+
+def parse_legacy(payload: bytes) -> List[Dict]:
+    # 旧实现: 整体 json.loads，再转换成字典列表
+    data = json.loads(payload)["data"]
+    return [
+        {
+            "asset": key,
+            "msg_hash": value["timestamped_signature"]["msg_hash"],
+            "price": value["price"],
+            "timestamp": value["timestamped_signature"]["timestamp"] / 1000000
+        }
+        for key, value in data.items()
+    ]
+
+def make_edge_payload(rng: random.Random) -> bytes:
+    # 数值 (小数、指数、负数)、字面量、转义和多字节字符都可能被切在数据块边界上
+    def number():
+        return rng.choice([rng.randrange(-10 ** 6, 10 ** 6), rng.uniform(-1e6, 1e6),
+                           float(f"{rng.uniform(1, 9):.3f}e{rng.randrange(-20, 20)}")])
+
+    data = {}
+    for i in range(rng.randrange(1, 5)):
+        asset = f"资产{i}\"\\USD"
+        data[asset] = {
+            "price": str(rng.randrange(10 ** 18, 10 ** 24)),
+            "asset_id": asset,
+            "extra": [number(), True, None, {"k": number()}],
+            "timestamped_signature": {"timestamp": 1700000000000000000 + i, "msg_hash": f"0x{i:064x}"}
+        }
+    payload = {"took": number(), "ok": True, "data": data, "error": None, "ratio": number()}
+    return json.dumps(payload, ensure_ascii=False, indent=rng.choice([None, 1])).encode()
+
+def check_chunk_splits(rounds: int):
+    # 任意位置切块后的流式解析结果必须与整体 json.loads 一致
+    rng = random.Random(2)
+    for _ in range(rounds):
+        payload = make_edge_payload(rng)
+        expected = [bot.parse_signed_price(key, value) for key, value in json.loads(payload)["data"].items()]
+        cuts = sorted(rng.sample(range(1, len(payload)), min(len(payload) - 1, rng.randrange(1, 12))))
+        chunks = [payload[start:end] for start, end in zip([0] + cuts, cuts + [len(payload)])]
+        actual = list(iter_signed_prices(chunks))
+        assert actual == expected, f"切块 {cuts} 后解析结果不一致: {payload!r}"
+    print(f"切块检查: {rounds} 次随机切分与 json.loads 结果一致")
+
+def parse_streaming(payload: bytes) -> List[SignedPrice]:
+    chunks = (payload[i:i + 65536] for i in range(0, len(payload), 65536))
+    return list(iter_signed_prices(chunks))
+
+def bench_parse(args):
+    check_chunk_splits(args.split_rounds)
+    payload = make_payload(args.count, args.publishers)
+    print(f"载荷: {args.count} 个资产, {len(payload) / 1024 / 1024:.1f} MB")
+    for name, parse in (("json.loads + dict", parse_legacy), ("流式解析 + SignedPrice", parse_streaming)):
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            parse(payload)
+            timings.append(time.perf_counter() - start)
+        tracemalloc.start()
+        result = parse(payload)
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+        print(f"{name}: 耗时 {statistics.median(timings) * 1000:.1f} ms, "
+              f"峰值内存 {peak / 1024 / 1024:.1f} MB, 结果占用 {retained / 1024 / 1024:.1f} MB")
+
+def percentile(values: List[float], pct: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+def use_isolated_state(directory: str):
+    # 基准使用临时目录中的令牌库和去重库，不影响正式运行的数据
+    bot.token_store = bot.TokenStore(os.path.join(directory, "tokens.db"))
+    bot.submission_cache = bot.SubmissionCache(os.path.join(directory, "state.db"), CONFIG["dedup"])
+    bot.user_stats = bot.UserStatsTracker(CONFIG["stats"])
+    bot.run_journal = bot.RunJournal(os.path.join(directory, "journal.jsonl"), CONFIG["journal"])
+
+def record_latencies(latencies: Dict[str, List[float]]):
+    original_request = bot.transports.request
+
+    def timed_request(method, url, proxy=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original_request(method, url, proxy, **kwargs)
+        finally:
+            latencies[f"{method} {urlsplit(url).path}"].append(time.perf_counter() - start)
+
+    bot.transports.request = timed_request
+
+async def drive_scheduler(accounts: List[Dict], cycles: int,
+                          on_cycle: Optional[Callable[[int, bot.AccountContextPool], None]] = None,
+                          timeout: Optional[float] = None):
+    done = 0
+    finished = asyncio.Event()
+    # 与 run_bot 一样使用有界的共享线程池，才能暴露线程被占满导致的死锁
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=CONFIG["threads"]["max_workers"], thread_name_prefix="stork-io")
+    )
+    token_refresher = bot.TokenRefreshScheduler(CONFIG["tokens"])
+    token_refresher.start()
+    contexts = bot.AccountContextPool(CONFIG, False, [], token_refresher)
+
+    async def process_account(account: Dict):
+        nonlocal done
+        async with bot.cycle_profiler.cycle(account["username"]):
+            await bot.run_account_cycle(account, len(accounts), contexts)
+        done += 1
+        if on_cycle:
+            on_cycle(done, contexts)
+        if done >= cycles * len(accounts):
+            finished.set()
+
+    scheduler = bot.AccountScheduler(accounts, CONFIG["scheduler"], 0)
+    task = asyncio.create_task(scheduler.run(process_account))
+    try:
+        await asyncio.wait_for(finished.wait(), timeout)
+    finally:
+        task.cancel()
+    await bot.user_stats.wait_reconciled()
+    token_refresher.stop()
+    return scheduler.lag_report()
+
+def bench_loop(args):
+    if not args.verbose:
+        bot.logger.setLevel(logging.WARNING)
+    state = MockStorkState(args.assets, args.rotate_seconds, args.latency_ms, args.jitter_ms,
+                           args.error_rate, args.throttle_rate, seed=1)
+    server = MockStorkServer(state)
+    server.start()
+    CONFIG["stork"].update(base_url=server.base_url, log_ip=False)
+    CONFIG["stats"]["reconcile_delay_seconds"] = 0.2
+    CONFIG["threads"]["max_workers"] = args.concurrency
+    CONFIG["pipeline"]["use_snapshot"] = not args.streaming
+    if args.queue_size:
+        CONFIG["pipeline"]["queue_size"] = args.queue_size
+    if args.profile:
+        CONFIG["profile"].update(enabled=True, every_n_cycles=1)
+        bot.cycle_profiler.start()
+    CONFIG["retry"]["base_delay"] = 0.05
+    if args.rate:
+        CONFIG["rate_limit"].update(rate=args.rate, burst=max(1, int(args.rate)))
+    bot.Cognito = StubCognito
+    StubCognito.latency_ms = args.auth_latency_ms
+    StubCognito.reset()
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    record_latencies(latencies)
+    accounts = [{"username": f"bench{i}@example.com", "password": "x"} for i in range(args.accounts)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        use_isolated_state(directory)
+        start = time.perf_counter()
+        try:
+            lag = asyncio.run(drive_scheduler(accounts, args.cycles, timeout=args.timeout or None))
+        except asyncio.TimeoutError:
+            sys.exit(f"{args.timeout:.0f} 秒内未跑完全部周期，流水线可能已死锁")
+        finally:
+            elapsed = time.perf_counter() - start
+            server.stop()
+            bot.cycle_profiler.stop()
+            bot.token_store.close()
+            bot.submission_cache.close()
+            bot.run_journal.close()
+            bot.transports.close()
+
+    submitted = sum(state.valid_count.values()) + sum(state.invalid_count.values())
+    total_cycles = args.cycles * args.accounts
+    print(f"账户: {args.accounts}, 每账户周期: {args.cycles}, 资产: {args.assets}, 并发: {args.concurrency}")
+    print(f"耗时: {elapsed:.2f} 秒, 提交验证: {submitted} 条, 吞吐: {submitted / elapsed:,.1f} 条/秒")
+    print(f"有效/无效: {sum(state.valid_count.values())}/{sum(state.invalid_count.values())}")
+    print(f"每周期认证次数: {(StubCognito.auth_calls + StubCognito.refresh_calls) / total_cycles:.3f} "
+          f"(SRP {StubCognito.auth_calls}, 刷新 {StubCognito.refresh_calls})")
+    for endpoint, values in sorted(latencies.items()):
+        values_ms = [v * 1000 for v in values]
+        print(f"{endpoint}: {len(values)} 次, p50 {percentile(values_ms, 50):.1f} ms, "
+              f"p95 {percentile(values_ms, 95):.1f} ms, p99 {percentile(values_ms, 99):.1f} ms")
+    print(f"统计核对不一致: {bot.user_stats.mismatch_count()} 次")
+    if lag:
+        print(f"最大调度延迟: {max(lag.values()):.2f} 秒")
+
+def bench_memory(args):
+    # 内存增长回归: 预热后记录基线，跑完数千个周期后比较 tracemalloc 统计的存活内存
+    bot.logger.setLevel(logging.WARNING)
+    state = MockStorkState(args.assets, args.rotate_seconds, 0, 0, 0, 0, seed=1)
+    server = MockStorkServer(state)
+    server.start()
+    CONFIG["stork"].update(base_url=server.base_url, log_ip=False)
+    CONFIG["stats"]["reconcile_delay_seconds"] = 0
+    CONFIG["rate_limit"].update(rate=10000, burst=10000)
+    # 价格轮换、短快照 TTL 和短令牌有效期: 测量期间持续拉取、验签、提交、写运行日志并刷新令牌
+    CONFIG["snapshot"]["ttl_seconds"] = min(CONFIG["snapshot"]["ttl_seconds"], args.rotate_seconds / 2)
+    CONFIG["journal"]["compact_bytes"] = 64 * 1024
+    CONFIG["threads"]["max_workers"] = args.concurrency
+    # 有上限的缓存调小，保证预热阶段就已填满，测量到的增长才是泄漏
+    CONFIG["verify"]["cache_size"] = 64
+    CONFIG["dedup"]["min_entries"] = 64
+    CONFIG["tokens"].update(refresh_lead_seconds=args.token_ttl / 3, refresh_jitter_seconds=args.token_ttl / 6,
+                            min_validity_seconds=1)
+    bot.Cognito = StubCognito
+    StubCognito.latency_ms = 0
+    StubCognito.token_ttl = args.token_ttl
+    StubCognito.reset()
+    accounts = [{"username": f"bench{i}@example.com", "password": "x"} for i in range(args.accounts)]
+    warmup = args.warmup * args.accounts
+    samples: Dict[str, int] = {}
+    pool_size = 0
+
+    def on_cycle(done: int, contexts: bot.AccountContextPool):
+        nonlocal pool_size
+        if done == warmup:
+            gc.collect()
+            samples["baseline"] = tracemalloc.get_traced_memory()[0]
+            samples["submitted"] = sum(state.valid_count.values())
+            samples["refreshes"] = StubCognito.refresh_calls
+        pool_size = len(contexts)
+
+    with tempfile.TemporaryDirectory() as directory:
+        use_isolated_state(directory)
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            asyncio.run(drive_scheduler(accounts, args.warmup + args.cycles, on_cycle))
+            gc.collect()
+            retained = tracemalloc.get_traced_memory()[0]
+        finally:
+            elapsed = time.perf_counter() - start
+            tracemalloc.stop()
+            server.stop()
+            bot.token_store.close()
+            bot.submission_cache.close()
+            bot.run_journal.close()
+            bot.transports.close()
+
+    cycles = args.cycles * args.accounts
+    growth_kb = (retained - samples["baseline"]) / 1024
+    submitted = sum(state.valid_count.values()) - samples["submitted"]
+    refreshes = StubCognito.refresh_calls - samples["refreshes"]
+    # 测量阶段必须真的做了提交和令牌刷新，否则内存数据没有意义
+    ok = (growth_kb <= args.max_growth_kb and StubCognito.instances == args.accounts
+          and pool_size == args.accounts and submitted > 0 and refreshes > 0)
+    print(f"账户: {args.accounts}, 测量周期: {cycles} (预热 {warmup}), 耗时: {elapsed:.2f} 秒")
+    print(f"Cognito 实例: {StubCognito.instances}, 上下文池: {pool_size}, SRP 认证: {StubCognito.auth_calls}")
+    print(f"测量阶段: 提交 {submitted} 条, 令牌刷新 {refreshes} 次")
+    print(f"存活内存增长: {growth_kb:.1f} KiB (上限 {args.max_growth_kb} KiB), "
+          f"每周期 {growth_kb * 1024 / cycles:.1f} B, {'通过' if ok else '未达标'}")
+    if not ok:
+        sys.exit(1)
+
+# 启动耗时目标 (毫秒)，超出时 startup 基准以非零状态退出
+STARTUP_TARGETS_MS = {"warm": 400, "cold": 1000}
+
+STARTUP_SNIPPETS = {
+    # 令牌库中有有效令牌: 不应导入 pycognito/boto3
+    "warm": """
+import time
+start = time.perf_counter()
+import sys, bot
+bot.token_store = bot.TokenStore({db!r})
+bot.TokenHandler("bench@example.com", "x", bot.CONFIG)
+print(time.perf_counter() - start, "pycognito" in sys.modules)
+""",
+    # 无令牌: 计到即将发起 SRP 认证为止 (导入 pycognito 并创建 boto3 客户端)
+    "cold": """
+import time
+start = time.perf_counter()
+import sys, bot
+cognito = bot.CONFIG["cognito"]
+bot.load_cognito_class()(
+    user_pool_id=cognito["user_pool_id"], client_id=cognito["client_id"],
+    user_pool_region=cognito["region"], username="bench@example.com"
+)
+print(time.perf_counter() - start, "pycognito" in sys.modules)
+"""
+}
+
+def bench_startup(args):
+    failed = False
+    with tempfile.TemporaryDirectory() as directory:
+        db = os.path.join(directory, "tokens.db")
+        store = bot.TokenStore(db)
+        store.put("bench@example.com", {
+            "access_token": StubCognito.issue_token("bench@example.com", "access"),
+            "refresh_token": "refresh-bench@example.com",
+            "id_token": StubCognito.issue_token("bench@example.com", "id"),
+            "expires_at": time.time() + 3600
+        })
+        store.close()
+        for mode, snippet in STARTUP_SNIPPETS.items():
+            samples = []
+            for _ in range(args.runs):
+                output = subprocess.run(
+                    [sys.executable, "-c", snippet.format(db=db)],
+                    capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+                ).stdout.split()
+                samples.append(float(output[-2]) * 1000)
+                loaded_cognito = output[-1] == "True"
+            median = statistics.median(samples)
+            target = STARTUP_TARGETS_MS[mode]
+            ok = median <= target and (mode != "warm" or not loaded_cognito)
+            failed |= not ok
+            print(f"{mode}: 中位数 {median:.0f} ms (目标 {target} ms), 导入 pycognito: {loaded_cognito}, "
+                  f"{'通过' if ok else '未达标'}")
+    if failed:
+        sys.exit(1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Stork-bot 性能基准")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    verify_parser = subparsers.add_parser("verify", help="签名验证吞吐量")
+    verify_parser.add_argument("--count", type=int, default=200)
+    verify_parser.add_argument("--processes", type=int, default=0)
+    verify_parser.set_defaults(func=bench_verify)
+
+    loop_parser = subparsers.add_parser("loop", help="对本地模拟服务跑完整的主循环")
+    loop_parser.add_argument("--accounts", type=int, default=3)
+    loop_parser.add_argument("--cycles", type=int, default=5)
+    loop_parser.add_argument("--assets", type=int, default=20)
+    loop_parser.add_argument("--concurrency", type=int, default=8)
+    loop_parser.add_argument("--rotate-seconds", type=float, default=0.5)
+    loop_parser.add_argument("--latency-ms", type=float, default=20.0)
+    loop_parser.add_argument("--jitter-ms", type=float, default=10.0)
+    loop_parser.add_argument("--error-rate", type=float, default=0.0)
+    loop_parser.add_argument("--throttle-rate", type=float, default=0.0)
+    loop_parser.add_argument("--rate", type=float, default=0, help="覆盖每个接口的限流速率 (次/秒)")
+    loop_parser.add_argument("--auth-latency-ms", type=float, default=200.0)
+    loop_parser.add_argument("--streaming", action="store_true", help="关闭共享快照，每个账户边下载边解析")
+    loop_parser.add_argument("--queue-size", type=int, default=0, help="覆盖流水线队列长度")
+    loop_parser.add_argument("--timeout", type=float, default=0, help="超过该秒数仍未跑完则判定失败")
+    loop_parser.add_argument("--profile", action="store_true", help="按周期剖析，结果写入 profiles/")
+    loop_parser.add_argument("--verbose", action="store_true")
+    loop_parser.set_defaults(func=bench_loop)
+
+    memory_parser = subparsers.add_parser("memory", help="长时间运行的内存增长回归检查")
+    memory_parser.add_argument("--accounts", type=int, default=4)
+    memory_parser.add_argument("--cycles", type=int, default=500, help="每个账户的测量周期数")
+    memory_parser.add_argument("--warmup", type=int, default=100, help="每个账户的预热周期数")
+    memory_parser.add_argument("--assets", type=int, default=5)
+    memory_parser.add_argument("--concurrency", type=int, default=8)
+    memory_parser.add_argument("--rotate-seconds", type=float, default=1.0)
+    memory_parser.add_argument("--token-ttl", type=float, default=6.0, help="模拟令牌有效期 (秒)")
+    memory_parser.add_argument("--max-growth-kb", type=float, default=256)
+    memory_parser.set_defaults(func=bench_memory)
+
+    parse_parser = subparsers.add_parser("parse", help="价格载荷解析耗时与内存")
+    parse_parser.add_argument("--count", type=int, default=20000)
+    parse_parser.add_argument("--publishers", type=int, default=5)
+    parse_parser.add_argument("--runs", type=int, default=3)
+    parse_parser.add_argument("--split-rounds", type=int, default=3000, help="随机切块正确性检查的次数")
+    parse_parser.set_defaults(func=bench_parse)
+
+    startup_parser = subparsers.add_parser("startup", help="冷启动 / 热令牌启动耗时")
+    startup_parser.add_argument("--runs", type=int, default=5)
+    startup_parser.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
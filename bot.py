@@ -1,22 +1,54 @@
+import argparse
+import asyncio
+import atexit
+import base64
+import codecs
+import contextvars
+import cProfile
+import hashlib
+import heapq
+import hmac
+import io
 import json
 import os
+import pstats
+import queue
+import re
+import random
+import sqlite3
+import sys
 import time
+import tracemalloc
 from datetime import datetime, timezone, timedelta
 import threading
-from concurrent.futures import ThreadPoolExecutor
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from decimal import Decimal
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util import create_urllib3_context
 import logging
-from typing import Dict, List, Optional
-from pycognito import Cognito
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from colorama import Fore, Back, Style, init
 
 # 初始化 colorama
 init(autoreset=True)
 
-# 配置彩色日志
+# 日志时间统一使用北京时间 (UTC+8)
+def beijing_time_converter(timestamp: float) -> time.struct_time:
+    return time.gmtime(timestamp + 8 * 3600)
+
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*m')
+
+# 配置彩色日志 (仅用于终端)
 class ColoredFormatter(logging.Formatter):
+    converter = staticmethod(beijing_time_converter)
     level_colors = {
         logging.DEBUG: Fore.CYAN + Style.DIM,
         logging.INFO: Fore.GREEN,
@@ -26,20 +58,130 @@ class ColoredFormatter(logging.Formatter):
     }
 
     def format(self, record):
+        # 复制一份再上色，避免改写 record 影响其他 handler
+        record = logging.makeLogRecord(record.__dict__)
         level_color = self.level_colors.get(record.levelno, Fore.WHITE)
         record.levelname = f"{level_color}{record.levelname}{Style.RESET_ALL}"
-        record.msg = f"{Fore.WHITE}{record.msg}{Style.RESET_ALL}"
+        record.msg = f"{Fore.WHITE}{record.getMessage()}{Style.RESET_ALL}"
+        record.args = None
         return super().format(record)
 
+# 纯文本单行格式，去掉颜色代码，便于写入文件或被采集
+class LineFormatter(logging.Formatter):
+    converter = staticmethod(beijing_time_converter)
+
+    def format(self, record):
+        return ANSI_ESCAPE.sub('', super().format(record))
+
+class JsonFormatter(logging.Formatter):
+    converter = staticmethod(beijing_time_converter)
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, '%Y-%m-%dT%H:%M:%S+08:00'),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "message": ANSI_ESCAPE.sub('', record.getMessage())
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+# 按 sample_key 限速的过滤器: 每个 key 每秒最多放行若干条，被省略的条数附在下一条放行的日志后
+class SampledLogFilter(logging.Filter):
+    def __init__(self, per_second: float):
+        super().__init__()
+        self.per_second = per_second
+        self._lock = threading.Lock()
+        self._windows: Dict[str, List] = {}
+
+    def filter(self, record):
+        key = getattr(record, "sample_key", None)
+        if key is None or self.per_second <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= 1.0:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+            elif window[1] < self.per_second:
+                window[1] += 1
+                suppressed = 0
+            else:
+                window[2] += 1
+                return False
+        if suppressed:
+            record.msg = f"{record.msg} (省略同类日志 {suppressed} 条)"
+        return True
+
+# 进程内队列: 调用方只负责入队，格式化和写出都在后台线程完成；队列满时丢弃并计数
+class AsyncQueueHandler(QueueHandler):
+    dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            AsyncQueueHandler.dropped += 1
+            metrics.inc("log_records_dropped_total")
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
-handler = logging.StreamHandler()
-handler.setFormatter(ColoredFormatter(
-    fmt=f'[{Fore.GREEN}%(asctime)s{Style.RESET_ALL}] [%(levelname)s] %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-))
-logger.addHandler(handler)
-logging.Formatter.converter = lambda *args: (datetime.now(timezone.utc) + timedelta(hours=8)).timetuple()
+_log_listener: Optional[QueueListener] = None
+
+def configure_logging(logging_config: Dict):
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+    for existing in list(logger.handlers):
+        logger.removeHandler(existing)
+        existing.close()
+
+    stream_handler = logging.StreamHandler()
+    log_format = logging_config["format"]
+    if log_format == "auto":
+        log_format = "color" if stream_handler.stream.isatty() else "line"
+    if log_format == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    elif log_format == "line":
+        stream_handler.setFormatter(LineFormatter(fmt='[%(asctime)s] [%(levelname)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
+    else:
+        stream_handler.setFormatter(ColoredFormatter(
+            fmt=f'[{Fore.GREEN}%(asctime)s{Style.RESET_ALL}] [%(levelname)s] %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        ))
+
+    sampler = SampledLogFilter(logging_config["success_sample_per_second"])
+    if logging_config["async"]:
+        queue_handler = AsyncQueueHandler(queue.Queue(maxsize=logging_config["queue_size"]))
+        queue_handler.addFilter(sampler)
+        logger.addHandler(queue_handler)
+        _log_listener = QueueListener(queue_handler.queue, stream_handler)
+        _log_listener.start()
+    else:
+        stream_handler.addFilter(sampler)
+        logger.addHandler(stream_handler)
+
+def shutdown_logging():
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        if AsyncQueueHandler.dropped:
+            # 监听线程已停止，直接交给输出 handler，避免再次入队
+            record = logger.makeRecord(
+                logger.name, logging.WARNING, __file__, 0,
+                f"{Fore.YELLOW}日志队列已满，共丢弃 {AsyncQueueHandler.dropped} 条日志", None, None
+            )
+            for handler in _log_listener.handlers:
+                handler.handle(record)
+        _log_listener = None
+
+atexit.register(shutdown_logging)
 
 # 北京时间偏移 (UTC+8)
 BEIJING_OFFSET = timedelta(hours=8)
@@ -55,16 +197,118 @@ CONFIG = {
         "base_url": "https://app-api.jp.stork-oracle.network/v1",
         "auth_url": "https://api.jp.stork-oracle.network/auth",
         "interval_seconds": 5,
+        "log_ip": True,
         "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36",
         "origin": "chrome-extension://knnliglhgkmlblppdejchidfihjnockl"
     },
+    "run": {
+        # None 表示交互询问 (非交互模式下默认直连)
+        "use_proxy": None
+    },
+    "scheduler": {
+        "max_parallel_accounts": 4,
+        "error_backoff_seconds": 60,
+        "lag_warning_seconds": 30,
+        # 按用户名单独设置轮询间隔 (秒)，未设置的账户使用 stork.interval_seconds
+        "account_intervals": {}
+    },
     "threads": {
+        # 默认与原来一样只用 1 个 I/O 线程，对线上接口的并发请求最少；需要更高吞吐时用 --max-workers 调大
         "max_workers": 1
+    },
+    "tokens": {
+        "refresh_lead_seconds": 300,
+        "refresh_jitter_seconds": 60,
+        "min_validity_seconds": 30,
+        "retry_seconds": 30
+    },
+    "verify": {
+        "require_signature": False,
+        "processes": 0,
+        "parallel_threshold": 64,
+        "cache_size": 4096
+    },
+    "pipeline": {
+        "queue_size": 64,
+        "verify_workers": 1,
+        "verify_batch": 32,
+        "submit_workers": 0,
+        # 从共享价格快照取数据；关闭后每个账户各自边下载边解析
+        "use_snapshot": True
+    },
+    "snapshot": {
+        "ttl_seconds": 2
+    },
+    "stats": {
+        "ttl_seconds": 60,
+        # 提交后等待多久再核对服务端计数
+        "reconcile_delay_seconds": 30,
+        "mismatch_tolerance": 0
+    },
+    "dedup": {
+        "ttl_seconds": 3600,
+        "retention_cycles": 10,
+        "min_entries": 1024
+    },
+    "journal": {
+        "enabled": True,
+        # 超过此大小时压缩运行日志
+        "compact_bytes": 1048576,
+        # 每条记录都 fsync，可抵御断电，代价是每次提交多一次磁盘同步
+        "fsync": False
+    },
+    "rate_limit": {
+        "rate": 20.0,
+        "burst": 20,
+        "min_rate": 0.2,
+        "increase_step": 0.1,
+        "decrease_factor": 0.5
+    },
+    "retry": {
+        "max_attempts": 4,
+        "base_delay": 0.5,
+        "max_delay": 20
+    },
+    "circuit": {
+        "failure_threshold": 5,
+        "cooldown_seconds": 30
+    },
+    "logging": {
+        # auto: 终端彩色输出，非终端输出去色的单行文本；也可指定 color / line / json
+        "format": "auto",
+        "async": True,
+        "queue_size": 10000,
+        # 每条请求的成功日志每秒最多输出条数，0 表示不限
+        "success_sample_per_second": 5
+    },
+    "profile": {
+        "enabled": False,
+        # 每隔多少个账户周期剖析一次，调大后可在生产环境常开
+        "every_n_cycles": 10,
+        "sample_interval_ms": 10,
+        "tracemalloc": True,
+        "trace_frames": 1,
+        "top": 20,
+        "output_dir": "profiles"
+    },
+    "metrics": {
+        "enabled": False,
+        "host": "127.0.0.1",
+        "port": 9108
+    },
+    "http": {
+        "connect_timeout": 5,
+        "read_timeout": 15,
+        "pool_maxsize": 10
     }
 }
 
+configure_logging(CONFIG["logging"])
+
 ACCOUNTS_PATH = 'accounts.txt'
-TOKENS_PATH = 'tokens.txt'
+TOKENS_PATH = 'tokens.db'
+STATE_PATH = 'state.db'
+JOURNAL_PATH = 'journal.jsonl'
 PROXIES_PATH = 'proxies.txt'
 
 # 美观化组件
@@ -84,6 +328,11 @@ def get_banner_text():
     """
     return banner
 
+def mask_username(email: str) -> str:
+    # 不带颜色的脱敏用户名，用于指标标签等机器可读输出
+    name, _, domain = email.partition('@')
+    return f"{name[:4]}****@{domain}" if domain else email
+
 def mask_email(email: str) -> str:
     if '@' not in email:
         return f"{Fore.YELLOW}{email}"
@@ -115,15 +364,72 @@ def load_accounts() -> List[Dict]:
         logger.error(f"{Fore.RED}加载账户文件失败: {e}")
         return []
 
-def load_tokens() -> Dict:
-    if not os.path.exists(TOKENS_PATH):
-        logger.warning(f"{Fore.YELLOW}未找到令牌文件 {TOKENS_PATH}，将创建空令牌")
-        with open(TOKENS_PATH, 'w', encoding='utf-8') as f:
-            f.write("{}")
-        return {}
+# 令牌存储: 按用户名分别保存，SQLite 负责原子写入和多进程写锁，内存缓存负责读
+class TokenStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Dict] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS tokens ("
+                "username TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+        return self._conn
+
+    def get(self, username: str) -> Dict:
+        with self._lock:
+            if username in self._cache:
+                return dict(self._cache[username])
+            row = self._connection().execute(
+                "SELECT data FROM tokens WHERE username = ?", (username,)
+            ).fetchone()
+            tokens = json.loads(row[0]) if row else {}
+            self._cache[username] = tokens
+            return dict(tokens)
+
+    def put(self, username: str, tokens: Dict):
+        data = json.dumps(tokens, ensure_ascii=False)
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO tokens (username, data, updated_at) VALUES (?, ?, ?)",
+                    (username, data, time.time())
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._cache[username] = dict(tokens)
+
+    def invalidate(self, username: Optional[str] = None):
+        with self._lock:
+            if username is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(username, None)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+token_store = TokenStore(TOKENS_PATH)
+
+def load_tokens(username: str) -> Dict:
     try:
-        with open(TOKENS_PATH, 'r', encoding='utf-8') as f:
-            tokens = json.loads(f.read().strip())
+        tokens = token_store.get(username)
+        if not tokens:
+            logger.info(f"{Fore.YELLOW}账户 {mask_email(username)} 暂无保存的令牌")
+            return {}
         expires_at = tokens.get("expires_at", 0)
         beijing_expires = datetime.fromtimestamp(expires_at, tz=timezone.utc) + BEIJING_OFFSET
         logger.info(f"{Fore.GREEN}加载令牌成功，过期时间: {beijing_expires.strftime('%Y-%m-%d %H:%M:%S')}")
@@ -132,15 +438,286 @@ def load_tokens() -> Dict:
         logger.warning(f"{Fore.YELLOW}加载令牌失败: {e}")
         return {}
 
-def save_tokens(tokens: Dict):
+def save_tokens(username: str, tokens: Dict):
     try:
-        with open(TOKENS_PATH, 'w', encoding='utf-8') as f:
-            json.dump(tokens, f, ensure_ascii=False)
+        token_store.put(username, tokens)
         beijing_expires = datetime.fromtimestamp(tokens["expires_at"], tz=timezone.utc) + BEIJING_OFFSET
         logger.info(f"{Fore.GREEN}令牌保存成功，过期时间: {beijing_expires.strftime('%Y-%m-%d %H:%M:%S')}")
     except Exception as e:
         logger.error(f"{Fore.RED}保存令牌失败: {e}")
 
+# 已提交去重: 按 (账户, msg_hash) 记录已确认的验证，内存有界 + TTL 淘汰，并持久化以便重启后继续跳过
+class SubmissionCache:
+    def __init__(self, path: str, dedup_config: Dict):
+        self.path = path
+        self.dedup_config = dedup_config
+        self.max_entries = dedup_config["min_entries"]
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._loaded = False
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS submissions ("
+                "username TEXT NOT NULL, msg_hash TEXT NOT NULL, acked_at REAL NOT NULL, "
+                "PRIMARY KEY (username, msg_hash))"
+            )
+        return self._conn
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        cutoff = time.time() - self.dedup_config["ttl_seconds"]
+        conn = self._connection()
+        conn.execute("DELETE FROM submissions WHERE acked_at < ?", (cutoff,))
+        rows = conn.execute(
+            "SELECT username, msg_hash, acked_at FROM submissions ORDER BY acked_at"
+        ).fetchall()
+        for username, msg_hash, acked_at in rows:
+            self._entries[(username, msg_hash)] = acked_at
+        self.max_entries = max(self.max_entries, len(self._entries))
+
+    def _evict(self):
+        cutoff = time.time() - self.dedup_config["ttl_seconds"]
+        while self._entries:
+            key, acked_at = next(iter(self._entries.items()))
+            if acked_at >= cutoff and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    def resize(self, asset_count: int, account_count: int):
+        # 容量 = 资产数 x 账户数 x 保留周期数，资产列表变长时自动扩容
+        with self._lock:
+            needed = asset_count * account_count * self.dedup_config["retention_cycles"]
+            self.max_entries = max(self.dedup_config["min_entries"], needed)
+            self._evict()
+
+    def filter_new(self, username: str, prices: List["SignedPrice"]) -> List["SignedPrice"]:
+        with self._lock:
+            self._load()
+            self._evict()
+            return [price for price in prices if (username, price.msg_hash) not in self._entries]
+
+    def mark_acknowledged(self, username: str, msg_hashes: List[str]):
+        if not msg_hashes:
+            return
+        now = time.time()
+        with self._lock:
+            self._load()
+            for msg_hash in msg_hashes:
+                self._entries[(username, msg_hash)] = now
+                self._entries.move_to_end((username, msg_hash))
+            self._evict()
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO submissions (username, msg_hash, acked_at) VALUES (?, ?, ?)",
+                    [(username, msg_hash, now) for msg_hash in msg_hashes]
+                )
+                conn.execute("DELETE FROM submissions WHERE acked_at < ?", (now - self.dedup_config["ttl_seconds"],))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+submission_cache = SubmissionCache(STATE_PATH, CONFIG["dedup"])
+
+# 运行日志: 追加写入待确认/已确认的提交和各账户完成周期的时间，进程崩溃后启动时回放，
+# 已确认的提交补写进去重库，账户按上次完成时间续排；文件过大时压缩为仅含当前状态的新文件。
+# 调用方 (事件循环) 只更新内存状态并入队，写文件、fsync 和压缩都在后台写入线程中完成
+class RunJournal:
+    def __init__(self, path: str, journal_config: Dict):
+        self.path = path
+        self.journal_config = journal_config
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self._replayed = False
+        self._last_completed: Dict[str, float] = {}
+        self._pending: Dict[Tuple[str, str], float] = {}
+        # 已写入日志但尚未落入去重库的确认
+        self._unsettled: Dict[Tuple[str, str], float] = {}
+        self._queue: "queue.Queue[Optional[Dict]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.journal_config["enabled"]
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+            self._size = self._file.tell()
+        return self._file
+
+    def _enqueue(self, record: Dict):
+        # 需持有 self._lock: 内存状态与入队保持同一顺序，压缩时才能安全丢弃队列中的记录
+        self._queue.put(record)
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="run-journal", daemon=True)
+            self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            records = [self._queue.get()]
+            while True:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = None in records
+            records = [record for record in records if record is not None]
+            try:
+                if records:
+                    self._append(records)
+            except OSError as e:
+                logger.error(f"{Fore.RED}写入运行日志失败: {e}")
+            if stopping:
+                return
+
+    def _append(self, records: List[Dict]):
+        # 一批记录只 flush / fsync 一次
+        f = self._open()
+        data = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        f.write(data)
+        f.flush()
+        if self.journal_config["fsync"]:
+            os.fsync(f.fileno())
+        self._size += len(data)
+        if self._size >= self.journal_config["compact_bytes"]:
+            self._compact()
+
+    def _state_records(self) -> List[Dict]:
+        records = [{"type": "cycle", "user": user, "at": at} for user, at in self._last_completed.items()]
+        records += [{"type": "pending", "user": user, "hash": msg_hash, "at": at}
+                    for (user, msg_hash), at in self._pending.items()]
+        records += [{"type": "ack", "user": user, "hash": msg_hash, "at": at}
+                    for (user, msg_hash), at in self._unsettled.items()]
+        return records
+
+    def _compact(self):
+        # 先写临时文件并落盘，再原子替换，任何时刻崩溃都至少保留一份完整日志。
+        # 队列中尚未写出的记录已反映在内存状态里，取状态时一并丢弃
+        with self._lock:
+            state = self._state_records()
+            while True:
+                try:
+                    if self._queue.get_nowait() is None:
+                        self._queue.put(None)
+                        break
+                except queue.Empty:
+                    break
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in state:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._open()
+
+    def replay(self) -> Dict[str, float]:
+        # 返回各账户上次完成周期的时间 (Unix 时间戳)
+        if not self.enabled:
+            return {}
+        with self._lock:
+            if self._replayed:
+                return dict(self._last_completed)
+            self._replayed = True
+            acked: Dict[str, List[str]] = {}
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            # 崩溃时写了一半的最后一行
+                            continue
+                        user, kind = record.get("user"), record.get("type")
+                        if kind == "cycle":
+                            self._last_completed[user] = record["at"]
+                        elif kind == "pending":
+                            self._pending[(user, record["hash"])] = record["at"]
+                        elif kind in ("ack", "fail"):
+                            self._pending.pop((user, record["hash"]), None)
+                            if kind == "ack":
+                                acked.setdefault(user, []).append(record["hash"])
+            for user, hashes in acked.items():
+                submission_cache.mark_acknowledged(user, hashes)
+            if acked or self._pending:
+                logger.info(f"{Fore.BLUE}回放运行日志: 补记 {sum(len(h) for h in acked.values())} 条已确认提交，"
+                            f"{len(self._pending)} 条提交结果未知将重新提交")
+            # 结果未知的提交不在去重库里，下一周期会重新提交
+            self._pending.clear()
+            last_completed = dict(self._last_completed)
+        self._compact()
+        return last_completed
+
+    def record_pending(self, username: str, msg_hash: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            now = time.time()
+            self._pending[(username, msg_hash)] = now
+            self._enqueue({"type": "pending", "user": username, "hash": msg_hash, "at": now})
+
+    def record_result(self, username: str, msg_hash: str, acknowledged: bool):
+        if not self.enabled:
+            return
+        with self._lock:
+            now = time.time()
+            self._pending.pop((username, msg_hash), None)
+            if acknowledged:
+                self._unsettled[(username, msg_hash)] = now
+            self._enqueue({"type": "ack" if acknowledged else "fail", "user": username, "hash": msg_hash, "at": now})
+
+    def settle(self, username: str, msg_hashes: List[str]):
+        # 确认已写入去重库，压缩时不再保留
+        with self._lock:
+            for msg_hash in msg_hashes:
+                self._unsettled.pop((username, msg_hash), None)
+
+    def record_cycle(self, username: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            now = time.time()
+            self._last_completed[username] = now
+            self._enqueue({"type": "cycle", "user": username, "at": now})
+
+    def close(self):
+        # 先让写入线程写完队列中的记录再关闭文件
+        with self._lock:
+            writer, self._writer = self._writer, None
+            if writer is not None:
+                self._queue.put(None)
+        if writer is not None:
+            writer.join()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+run_journal = RunJournal(JOURNAL_PATH, CONFIG["journal"])
+
 def load_proxies() -> List[str]:
     if not os.path.exists(PROXIES_PATH):
         logger.warning(f"{Fore.YELLOW}未找到代理文件 {PROXIES_PATH}")
@@ -154,16 +731,950 @@ def load_proxies() -> List[str]:
         logger.error(f"{Fore.RED}加载代理失败: {e}")
         return []
 
+# 指标: 计数器 / 直方图 / 仪表，Prometheus 文本格式输出；未启用时各记录方法直接返回
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class _Timer:
+    def __init__(self, metrics: "Metrics", name: str, labels: Dict[str, str]):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class Metrics:
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, metrics_config: Dict):
+        self.metrics_config = metrics_config
+        self.enabled = metrics_config["enabled"]
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._gauges: Dict[Tuple[str, Tuple], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple], List] = {}
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def describe(self, name: str, kind: str, text: str):
+        self._help[name] = (kind, text)
+
+    def inc(self, name: str, amount: float = 1.0, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.DEFAULT_BUCKETS), 0, 0.0]
+            buckets = histogram[0]
+            for i, bound in enumerate(self.DEFAULT_BUCKETS):
+                if value <= bound:
+                    buckets[i] += 1
+                    break
+            histogram[1] += 1
+            histogram[2] += value
+
+    def timer(self, name: str, **labels):
+        return _Timer(self, name, labels) if self.enabled else _NULL_TIMER
+
+    @staticmethod
+    def _format_labels(labels: Tuple, extra: str = "") -> str:
+        parts = [f'{key}="{str(value)}"' for key, value in labels]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> str:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {key: (list(h[0]), h[1], h[2]) for key, h in self._histograms.items()}
+        lines = []
+        seen = set()
+
+        def header(name: str, kind: str):
+            if name not in seen:
+                seen.add(name)
+                help_text = self._help.get(name, (kind, name))[1]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name, "counter")
+            lines.append(f"{name}{self._format_labels(labels)} {value}")
+        for (name, labels), value in sorted(gauges.items()):
+            header(name, "gauge")
+            lines.append(f"{name}{self._format_labels(labels)} {value}")
+        for (name, labels), (buckets, count, total) in sorted(histograms.items()):
+            header(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(self.DEFAULT_BUCKETS, buckets):
+                cumulative += bucket_count
+                bucket_labels = self._format_labels(labels, 'le="%s"' % bound)
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            inf_labels = self._format_labels(labels, 'le="+Inf"')
+            lines.append(f"{name}_bucket{inf_labels} {count}")
+            lines.append(f"{name}_sum{self._format_labels(labels)} {total}")
+            lines.append(f"{name}_count{self._format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def start_server(self):
+        if not self.enabled or self._server is not None:
+            return
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.metrics_config["host"], self.metrics_config["port"]), MetricsHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+        logger.info(f"{Fore.GREEN}指标接口已启动: http://{self.metrics_config['host']}:{self.metrics_config['port']}/metrics")
+
+    def stop_server(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+metrics = Metrics(CONFIG["metrics"])
+metrics.describe("stork_request_duration_seconds", "histogram", "Stork API 请求耗时")
+metrics.describe("stork_requests_total", "counter", "Stork API 请求数 (按接口和状态码)")
+metrics.describe("cognito_request_duration_seconds", "histogram", "Cognito 认证/刷新耗时")
+metrics.describe("token_refresh_total", "counter", "令牌认证/刷新次数")
+metrics.describe("validations_total", "counter", "验证提交结果")
+metrics.describe("pipeline_queue_depth", "gauge", "流水线队列长度")
+metrics.describe("account_cycle_duration_seconds", "histogram", "单个账户周期耗时")
+metrics.describe("account_schedule_lag_seconds", "gauge", "账户落后计划的秒数")
+metrics.describe("stats_valid_count_drift", "gauge", "服务端有效验证数与本地预期之差")
+metrics.describe("stats_reconcile_mismatch_total", "counter", "有效验证数核对不一致次数")
+metrics.describe("log_records_dropped_total", "counter", "日志队列已满时丢弃的日志条数")
+
+# 周期剖析: --profile 时每 every_n_cycles 个账户周期采样一次。采样周期内按类别 (Cognito 认证 / HTTP I/O / 价格验证 / 日志)
+# 统计独占的墙钟与 CPU 时间，各类别代码段在所在线程内跑 cProfile，另有采样线程记录调用栈，
+# 周期结束后输出热点函数、tracemalloc 分配位置和可直接生成火焰图的折叠栈文件
+PROFILE_CATEGORIES = ("cognito", "http", "validate", "logging")
+
+_current_cycle_profile: contextvars.ContextVar = contextvars.ContextVar("current_cycle_profile", default=None)
+
+def create_detached_task(coro) -> asyncio.Task:
+    # 在空上下文中创建: 比周期活得久的后台任务不能继承当前周期的剖析对象，
+    # 否则报告写出后仍会往里记统计，还会让它的 tracemalloc 快照一直存活
+    return contextvars.Context().run(asyncio.create_task, coro)
+
+class CycleProfile:
+    def __init__(self, number: int, username: str):
+        self.number = number
+        self.username = username
+        self.started_at = time.perf_counter()
+        self.wall: Dict[str, float] = {}
+        self.cpu: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.stats: Optional[pstats.Stats] = None
+        self.stacks: Counter = Counter()
+        self.snapshot = None
+        self.lock = threading.Lock()
+
+    def add(self, category: str, wall: float, cpu: float, profile: Optional[cProfile.Profile]):
+        with self.lock:
+            self.wall[category] = self.wall.get(category, 0.0) + wall
+            self.cpu[category] = self.cpu.get(category, 0.0) + cpu
+            self.calls[category] = self.calls.get(category, 0) + 1
+            if profile is not None:
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+
+class _ProfileSection:
+    __slots__ = ("profiler", "cycle", "category", "wall", "cpu", "child_wall", "child_cpu", "profile")
+
+    def __init__(self, profiler: "CycleProfiler", cycle: CycleProfile, category: str):
+        self.profiler = profiler
+        self.cycle = cycle
+        self.category = category
+
+    def __enter__(self):
+        stack = self.profiler._stack()
+        self.child_wall = self.child_cpu = 0.0
+        self.profile = None
+        if not stack:
+            # 同一线程只运行一个 cProfile，嵌套的代码段只计时
+            try:
+                self.profile = cProfile.Profile()
+                self.profile.enable()
+            except ValueError:
+                self.profile = None
+        stack.append(self)
+        self.profiler._active[threading.get_ident()] = (self.cycle, self.category)
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.thread_time() - self.cpu
+        stack = self.profiler._stack()
+        stack.pop()
+        ident = threading.get_ident()
+        if stack:
+            parent = stack[-1]
+            parent.child_wall += wall
+            parent.child_cpu += cpu
+            self.profiler._active[ident] = (parent.cycle, parent.category)
+        else:
+            self.profiler._active.pop(ident, None)
+            if self.profile is not None:
+                self.profile.disable()
+        self.cycle.add(self.category, wall - self.child_wall, cpu - self.child_cpu, self.profile)
+        return False
+
+class CycleProfiler:
+    def __init__(self, profile_config: Dict):
+        self.profile_config = profile_config
+        self._cycles = 0
+        self._tracing = 0
+        self._local = threading.local()
+        self._active: Dict[int, Tuple[CycleProfile, str]] = {}
+        self._sampler: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self.profile_config["enabled"]
+
+    def _stack(self) -> List[_ProfileSection]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def section(self, category: str):
+        cycle = _current_cycle_profile.get()
+        if cycle is None:
+            return _NULL_TIMER
+        return _ProfileSection(self, cycle, category)
+
+    def start(self):
+        if not self.enabled or self._sampler is not None:
+            return
+        os.makedirs(self.profile_config["output_dir"], exist_ok=True)
+        for handler in logger.handlers:
+            handler.handle = self._wrap_logging(handler.handle)
+        self._stopped.clear()
+        self._sampler = threading.Thread(target=self._sample_stacks, name="cycle-profiler", daemon=True)
+        self._sampler.start()
+        logger.info(f"{Fore.BLUE}周期剖析已启用: 每 {self.profile_config['every_n_cycles']} 个周期采样一次，"
+                    f"输出到 {self.profile_config['output_dir']}")
+
+    def stop(self):
+        self._stopped.set()
+        self._sampler = None
+
+    def _wrap_logging(self, handle):
+        def profiled_handle(record):
+            with self.section("logging"):
+                return handle(record)
+        return profiled_handle
+
+    def _sample_stacks(self):
+        interval = self.profile_config["sample_interval_ms"] / 1000
+        while not self._stopped.wait(interval):
+            if not self._active:
+                continue
+            frames = sys._current_frames()
+            for ident, (cycle, category) in list(self._active.items()):
+                frame = frames.get(ident)
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                names.append(category)
+                with cycle.lock:
+                    cycle.stacks[";".join(reversed(names))] += 1
+
+    def _begin(self, username: str) -> Optional[CycleProfile]:
+        self._cycles += 1
+        if not self.enabled or (self._cycles - 1) % self.profile_config["every_n_cycles"]:
+            return None
+        cycle = CycleProfile(self._cycles, username)
+        if self.profile_config["tracemalloc"]:
+            # 只在采样周期内开启 tracemalloc；与其他周期重叠时用快照差值扣除开始前已有的分配
+            if self._tracing == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start(self.profile_config["trace_frames"])
+            self._tracing += 1
+            cycle.snapshot = tracemalloc.take_snapshot()
+        return cycle
+
+    def _end(self, cycle: CycleProfile):
+        elapsed = time.perf_counter() - cycle.started_at
+        end_snapshot = None
+        if cycle.snapshot is not None:
+            end_snapshot = tracemalloc.take_snapshot()
+            self._tracing -= 1
+            if self._tracing == 0:
+                tracemalloc.stop()
+        breakdown = ", ".join(f"{category} {cycle.wall.get(category, 0.0) * 1000:.0f} ms"
+                              for category in PROFILE_CATEGORIES)
+        logger.info(f"{Fore.BLUE}周期剖析 #{cycle.number} {mask_email(cycle.username)}: "
+                    f"总 {elapsed * 1000:.0f} ms, {breakdown}")
+        return elapsed, end_snapshot
+
+    def _write_report(self, cycle: CycleProfile, elapsed: float, end_snapshot):
+        top = self.profile_config["top"]
+        allocations = []
+        if end_snapshot is not None:
+            # 去掉剖析器自身 (cProfile / pstats / tracemalloc) 的分配
+            ignored = [tracemalloc.Filter(False, module.__file__) for module in (cProfile, pstats, tracemalloc)]
+            allocations = end_snapshot.filter_traces(ignored).compare_to(cycle.snapshot.filter_traces(ignored), "lineno")
+        account = re.sub(r'[^\w.@-]', '_', mask_username(cycle.username))
+        base = os.path.join(self.profile_config["output_dir"], f"cycle-{cycle.number:06d}-{account}")
+        lines = [f"周期 #{cycle.number} 账户 {mask_username(cycle.username)} 总耗时 {elapsed * 1000:.1f} ms", "",
+                 f"{'类别':<10}{'次数':>8}{'墙钟 ms':>12}{'CPU ms':>12}"]
+        for category in PROFILE_CATEGORIES:
+            lines.append(f"{category:<10}{cycle.calls.get(category, 0):>8}"
+                         f"{cycle.wall.get(category, 0.0) * 1000:>12.1f}{cycle.cpu.get(category, 0.0) * 1000:>12.1f}")
+        if cycle.stats is not None:
+            output = io.StringIO()
+            cycle.stats.stream = output
+            cycle.stats.sort_stats("cumulative").print_stats(top)
+            lines += ["", "热点函数 (按累计耗时):", output.getvalue()]
+        if allocations:
+            lines += ["", "分配位置 (周期内新增):"]
+            lines += [str(stat) for stat in allocations[:top]]
+        with open(f"{base}.txt", 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        with open(f"{base}.collapsed", 'w', encoding='utf-8') as f:
+            for stack, count in cycle.stacks.items():
+                f.write(f"{stack} {count}\n")
+
+    @asynccontextmanager
+    async def cycle(self, username: str):
+        cycle = self._begin(username)
+        if cycle is None:
+            yield
+            return
+        token = _current_cycle_profile.set(cycle)
+        try:
+            yield
+        finally:
+            _current_cycle_profile.reset(token)
+            elapsed, end_snapshot = self._end(cycle)
+            try:
+                await asyncio.to_thread(self._write_report, cycle, elapsed, end_snapshot)
+            except OSError as e:
+                logger.warning(f"{Fore.YELLOW}写入剖析结果失败: {e}")
+
+cycle_profiler = CycleProfiler(CONFIG["profile"])
+
 # 代理适配器
 class SocksAdapter(HTTPAdapter):
-    def __init__(self, proxy_url: str):
-        context = create_urllib3_context()
-        super().__init__(pool_connections=10, pool_maxsize=10, ssl_context=context)
+    def __init__(self, proxy_url: str, pool_connections: int = 10, pool_maxsize: int = 10):
         self.proxy_url = proxy_url
+        self.ssl_context = create_urllib3_context()
+        super().__init__(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["ssl_context"] = self.ssl_context
+        super().init_poolmanager(*args, **kwargs)
 
     def proxy_manager_for(self, *args, **kwargs):
-        from urllib3.contrib.socks import SOCKSProxyManager
-        return SOCKSProxyManager(self.proxy_url)
+        # 同一个 SOCKS 出口只建一次连接管理器，之后的请求复用其中的连接
+        manager = self.proxy_manager.get(self.proxy_url)
+        if manager is None:
+            from urllib3.contrib.socks import SOCKSProxyManager
+            manager = SOCKSProxyManager(
+                self.proxy_url,
+                num_pools=self._pool_connections,
+                maxsize=self._pool_maxsize,
+                ssl_context=self.ssl_context
+            )
+            self.proxy_manager[self.proxy_url] = manager
+        return manager
+
+# 传输层注册表: 按出口 (直连 / HTTP 代理 / SOCKS) 缓存 Session，连接长期复用
+class TransportRegistry:
+    def __init__(self, http_config: Dict):
+        self.http_config = http_config
+        self._lock = threading.Lock()
+        self._sessions: Dict[Tuple[str, Optional[str]], requests.Session] = {}
+        self._request_counts: Dict[Tuple[str, Optional[str]], int] = {}
+
+    @staticmethod
+    def egress_key(proxy: Optional[str]) -> Tuple[str, Optional[str]]:
+        if not proxy:
+            return ("direct", None)
+        if proxy.startswith("socks"):
+            return ("socks", proxy)
+        return ("http", proxy)
+
+    def _build_session(self, key: Tuple[str, Optional[str]]) -> requests.Session:
+        kind, proxy = key
+        pool_size = max(self.http_config["pool_maxsize"], CONFIG["threads"]["max_workers"])
+        session = requests.Session()
+        if kind == "socks":
+            adapter = SocksAdapter(proxy, pool_connections=pool_size, pool_maxsize=pool_size)
+        else:
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        if proxy:
+            session.proxies = {"https": proxy, "http": proxy}
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def session_for(self, proxy: Optional[str] = None) -> requests.Session:
+        key = self.egress_key(proxy)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = self._build_session(key)
+                self._request_counts[key] = 0
+            self._request_counts[key] += 1
+        return session
+
+    def request(self, method: str, url: str, proxy: Optional[str] = None, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", (self.http_config["connect_timeout"], self.http_config["read_timeout"]))
+        return self.session_for(proxy).request(method, url, **kwargs)
+
+    def stats(self) -> List[Dict]:
+        result = []
+        with self._lock:
+            items = list(self._sessions.items())
+            counts = dict(self._request_counts)
+        for key, session in items:
+            adapter = session.get_adapter("https://")
+            managers = [adapter.poolmanager, *adapter.proxy_manager.values()]
+            in_use = idle = pools = 0
+            for manager in managers:
+                for pool_key in list(manager.pools.keys()):
+                    pool = manager.pools.get(pool_key)
+                    if pool is None or pool.pool is None:
+                        continue
+                    pools += 1
+                    queued = list(pool.pool.queue)
+                    in_use += pool.pool.maxsize - len(queued)
+                    idle += sum(1 for conn in queued if conn is not None)
+            result.append({
+                "egress": key[0] if key[1] is None else f"{key[0]}:{key[1]}",
+                "requests": counts.get(key, 0),
+                "pools": pools,
+                "in_use": in_use,
+                "idle": idle
+            })
+        return result
+
+    def log_stats(self):
+        for item in self.stats():
+            logger.info(
+                f"{Fore.BLUE}连接池 {item['egress']}: 请求 {item['requests']} 次, "
+                f"使用中 {item['in_use']}, 空闲 {item['idle']}, 连接池数 {item['pools']}"
+            )
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            self._request_counts.clear()
+
+transports = TransportRegistry(CONFIG["http"])
+
+def jwt_expiry(token: Optional[str]) -> Optional[float]:
+    # 只解析载荷中的 exp，不做签名校验 (令牌来自 Cognito 本身)
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except Exception:
+        return None
+
+# 价格数据: 紧凑的定长记录，只保留验证和提交需要的字段
+@dataclass
+class SignedPrice:
+    __slots__ = ("asset", "msg_hash", "price", "timestamp", "raw_timestamp", "asset_id", "publisher_key", "signature")
+    asset: str
+    msg_hash: Optional[str]
+    price: Optional[str]
+    timestamp: Optional[float]
+    raw_timestamp: Optional[int]
+    asset_id: str
+    publisher_key: Optional[str]
+    # (r, s, v)，缺少签名时为 None
+    signature: Optional[Tuple]
+
+def parse_signed_price(key: str, value: Dict) -> SignedPrice:
+    signed = value.get("timestamped_signature") or {}
+    raw_timestamp = signed.get("timestamp")
+    signature = signed.get("signature")
+    return SignedPrice(
+        asset=key,
+        msg_hash=signed.get("msg_hash"),
+        price=value.get("price"),
+        timestamp=raw_timestamp / 1000000 if raw_timestamp is not None else None,
+        raw_timestamp=raw_timestamp,
+        asset_id=value.get("encoded_asset_id") or value.get("asset_id") or key,
+        publisher_key=value.get("publisher_key") or value.get("public_key"),
+        signature=(signature.get("r"), signature.get("s"), signature.get("v")) if signature else None
+    )
+
+# 增量解析 {"data": {资产: {...}, ...}}: 按数据块喂入，每解析完一个资产就产出一条记录，
+# 不会构建整棵 JSON 树；data 以外的顶层字段直接跳过
+class SignedPriceStreamParser:
+    _WHITESPACE = " \t\n\r"
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._state = "start"
+        self._key: Optional[str] = None
+        self._closed = False
+
+    def _skip_ws(self):
+        buf, pos = self._buf, self._pos
+        while pos < len(buf) and buf[pos] in self._WHITESPACE:
+            pos += 1
+        self._pos = pos
+
+    def _peek(self) -> Optional[str]:
+        self._skip_ws()
+        return self._buf[self._pos] if self._pos < len(self._buf) else None
+
+    def _expect(self, chars: str) -> Optional[str]:
+        char = self._peek()
+        if char is None:
+            return None
+        if char not in chars:
+            raise ValueError(f"价格数据格式错误: 位置 {self._pos} 期望 {chars!r}，实际 {char!r}")
+        self._pos += 1
+        return char
+
+    def _read_string(self) -> Optional[str]:
+        if self._expect('"') is None:
+            return None
+        try:
+            value, end = json.decoder.scanstring(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if self._closed:
+                raise
+            self._pos -= 1
+            return None
+        self._pos = end
+        return value
+
+    def _read_value(self):
+        # 数值可能被数据块截断 ("12." 会被解析成 12)，除非已到流末尾，否则要求数值之后紧跟分隔符
+        self._skip_ws()
+        try:
+            value, end = self._decoder.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if self._closed:
+                raise
+            return None, False
+        if not self._closed:
+            if end >= len(self._buf):
+                return None, False
+            if isinstance(value, (int, float)) and self._buf[end] not in self._WHITESPACE + ",}":
+                return None, False
+        self._pos = end
+        return value, True
+
+    def _parse(self) -> List[SignedPrice]:
+        prices = []
+        while True:
+            state = self._state
+            if state == "start":
+                if self._expect("{") is None:
+                    break
+                self._state = "top_key"
+            elif state in ("top_key", "data_key"):
+                char = self._peek()
+                if char is None:
+                    break
+                if char == "}":
+                    self._pos += 1
+                    self._state = "top_next" if state == "data_key" else "done"
+                    continue
+                key = self._read_string()
+                if key is None:
+                    break
+                self._key = key
+                self._state = "top_colon" if state == "top_key" else "data_colon"
+            elif state in ("top_colon", "data_colon"):
+                if self._expect(":") is None:
+                    break
+                if state == "data_colon":
+                    self._state = "data_value"
+                else:
+                    self._state = "data_open" if self._key == "data" else "top_value"
+            elif state == "data_open":
+                if self._expect("{") is None:
+                    break
+                self._state = "data_key"
+            elif state in ("top_value", "data_value"):
+                value, ok = self._read_value()
+                if not ok:
+                    break
+                if state == "data_value":
+                    prices.append(parse_signed_price(self._key, value))
+                    self._state = "data_next"
+                else:
+                    self._state = "top_next"
+            elif state in ("top_next", "data_next"):
+                char = self._expect(",}")
+                if char is None:
+                    break
+                if char == ",":
+                    self._state = "top_key" if state == "top_next" else "data_key"
+                else:
+                    self._state = "done" if state == "top_next" else "top_next"
+            else:
+                break
+        if self._pos > 65536:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        return prices
+
+    def feed(self, chunk: bytes) -> List[SignedPrice]:
+        self._buf += self._text.decode(chunk)
+        return self._parse()
+
+    def close(self) -> List[SignedPrice]:
+        self._buf += self._text.decode(b"", final=True)
+        self._closed = True
+        prices = self._parse()
+        if self._state != "done":
+            raise ValueError("价格数据不完整")
+        return prices
+
+def iter_signed_prices(chunks: Iterable[bytes]) -> Iterator[SignedPrice]:
+    parser = SignedPriceStreamParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+# 签名验证: Keccak-256 与 secp256k1 恢复公钥，优先使用已安装的原生实现，否则回退到纯 Python
+try:
+    from Crypto.Hash import keccak as _keccak_impl
+
+    def keccak256(data: bytes) -> bytes:
+        return _keccak_impl.new(digest_bits=256, data=data).digest()
+except ImportError:
+    _KECCAK_ROUND_CONSTANTS = [
+        0x0000000000000001, 0x0000000000008082, 0x800000000000808A, 0x8000000080008000,
+        0x000000000000808B, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+        0x000000000000008A, 0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+        0x000000008000808B, 0x800000000000008B, 0x8000000000008089, 0x8000000000008003,
+        0x8000000000008002, 0x8000000000000080, 0x000000000000800A, 0x800000008000000A,
+        0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008
+    ]
+    _KECCAK_ROTATIONS = [
+        [0, 36, 3, 41, 18], [1, 44, 10, 45, 2], [62, 6, 43, 15, 61],
+        [28, 55, 25, 21, 56], [27, 20, 39, 8, 14]
+    ]
+    _MASK64 = (1 << 64) - 1
+
+    def _keccak_f(state: List[List[int]]):
+        for rc in _KECCAK_ROUND_CONSTANTS:
+            c = [state[x][0] ^ state[x][1] ^ state[x][2] ^ state[x][3] ^ state[x][4] for x in range(5)]
+            d = [c[(x - 1) % 5] ^ (((c[(x + 1) % 5] << 1) | (c[(x + 1) % 5] >> 63)) & _MASK64) for x in range(5)]
+            for x in range(5):
+                for y in range(5):
+                    state[x][y] ^= d[x]
+            b = [[0] * 5 for _ in range(5)]
+            for x in range(5):
+                for y in range(5):
+                    r = _KECCAK_ROTATIONS[x][y]
+                    v = state[x][y]
+                    b[y][(2 * x + 3 * y) % 5] = ((v << r) | (v >> (64 - r))) & _MASK64 if r else v
+            for x in range(5):
+                for y in range(5):
+                    state[x][y] = b[x][y] ^ (~b[(x + 1) % 5][y] & b[(x + 2) % 5][y])
+            state[0][0] ^= rc
+
+    def keccak256(data: bytes) -> bytes:
+        rate = 136
+        padded = bytearray(data) + b'\x01' + b'\x00' * ((rate - (len(data) + 1) % rate) % rate)
+        padded[-1] |= 0x80
+        state = [[0] * 5 for _ in range(5)]
+        for offset in range(0, len(padded), rate):
+            block = padded[offset:offset + rate]
+            for i in range(rate // 8):
+                state[i % 5][i // 5] ^= int.from_bytes(block[i * 8:i * 8 + 8], 'little')
+            _keccak_f(state)
+        return b''.join(state[i % 5][i // 5].to_bytes(8, 'little') for i in range(4))
+
+_SECP256K1_P = 2 ** 256 - 2 ** 32 - 977
+_SECP256K1_N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+_SECP256K1_G = (
+    0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+    0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8,
+    1
+)
+
+def _jacobian_double(p: Tuple[int, int, int]) -> Tuple[int, int, int]:
+    x, y, z = p
+    if not y or not z:
+        return (0, 0, 0)
+    P = _SECP256K1_P
+    ysq = y * y % P
+    s = 4 * x * ysq % P
+    m = 3 * x * x % P
+    nx = (m * m - 2 * s) % P
+    ny = (m * (s - nx) - 8 * ysq * ysq) % P
+    nz = 2 * y * z % P
+    return (nx, ny, nz)
+
+def _jacobian_add(p: Tuple[int, int, int], q: Tuple[int, int, int]) -> Tuple[int, int, int]:
+    if not p[2]:
+        return q
+    if not q[2]:
+        return p
+    P = _SECP256K1_P
+    x1, y1, z1 = p
+    x2, y2, z2 = q
+    z1sq, z2sq = z1 * z1 % P, z2 * z2 % P
+    u1, u2 = x1 * z2sq % P, x2 * z1sq % P
+    s1, s2 = y1 * z2sq * z2 % P, y2 * z1sq * z1 % P
+    if u1 == u2:
+        return _jacobian_double(p) if s1 == s2 else (0, 0, 0)
+    h = u2 - u1
+    r = s2 - s1
+    h2 = h * h % P
+    h3 = h * h2 % P
+    u1h2 = u1 * h2 % P
+    nx = (r * r - h3 - 2 * u1h2) % P
+    ny = (r * (u1h2 - nx) - s1 * h3) % P
+    nz = h * z1 * z2 % P
+    return (nx, ny, nz)
+
+def _jacobian_multiply_sum(a: int, p: Tuple[int, int, int], b: int, q: Tuple[int, int, int]) -> Tuple[int, int, int]:
+    # Shamir 技巧: 一次遍历同时计算 a*P + b*Q
+    pq = _jacobian_add(p, q)
+    result = (0, 0, 0)
+    for i in range(max(a.bit_length(), b.bit_length()) - 1, -1, -1):
+        result = _jacobian_double(result)
+        bit_a, bit_b = (a >> i) & 1, (b >> i) & 1
+        if bit_a and bit_b:
+            result = _jacobian_add(result, pq)
+        elif bit_a:
+            result = _jacobian_add(result, p)
+        elif bit_b:
+            result = _jacobian_add(result, q)
+    return result
+
+def _to_affine(p: Tuple[int, int, int]) -> Tuple[int, int]:
+    x, y, z = p
+    P = _SECP256K1_P
+    zinv = pow(z, -1, P)
+    zinv2 = zinv * zinv % P
+    return (x * zinv2 % P, y * zinv2 * zinv % P)
+
+def _public_key_bytes(point: Tuple[int, int]) -> bytes:
+    return point[0].to_bytes(32, 'big') + point[1].to_bytes(32, 'big')
+
+try:
+    import coincurve as _coincurve
+except ImportError:
+    _coincurve = None
+
+def recover_public_key(digest: bytes, r: int, s: int, recovery_id: int) -> Optional[bytes]:
+    N, P = _SECP256K1_N, _SECP256K1_P
+    if not (0 < r < N and 0 < s < N) or recovery_id not in (0, 1):
+        return None
+    if _coincurve is not None:
+        try:
+            signature = r.to_bytes(32, 'big') + s.to_bytes(32, 'big') + bytes([recovery_id])
+            return _coincurve.PublicKey.from_signature_and_message(signature, digest, hasher=None).format(compressed=False)[1:]
+        except Exception:
+            return None
+    alpha = (pow(r, 3, P) + 7) % P
+    beta = pow(alpha, (P + 1) // 4, P)
+    if beta * beta % P != alpha:
+        return None
+    y = beta if beta % 2 == recovery_id else P - beta
+    rinv = pow(r, -1, N)
+    e = int.from_bytes(digest, 'big')
+    point = _jacobian_multiply_sum((-e * rinv) % N, _SECP256K1_G, (s * rinv) % N, (r, y, 1))
+    if not point[2]:
+        return None
+    return _public_key_bytes(_to_affine(point))
+
+def public_key_to_address(public_key: bytes) -> bytes:
+    return keccak256(public_key)[12:]
+
+def eth_signed_digest(msg_hash: bytes) -> bytes:
+    return keccak256(b"\x19Ethereum Signed Message:\n32" + msg_hash)
+
+def _hex_to_bytes(value: str) -> bytes:
+    return bytes.fromhex(value[2:] if value.startswith(("0x", "0X")) else value)
+
+@lru_cache(maxsize=1024)
+def _publisher_address(publisher_key: str) -> bytes:
+    address = _hex_to_bytes(publisher_key)
+    if len(address) != 20:
+        raise ValueError(f"无效的发布者地址: {publisher_key}")
+    return address
+
+def quantize_price(price) -> int:
+    text = str(price)
+    if '.' in text or 'e' in text.lower():
+        return int(Decimal(text) * (10 ** 18))
+    return int(text)
+
+def price_message_hash(publisher_key: str, asset_id: str, timestamp: int, price) -> bytes:
+    # keccak256(publisher 地址 || 资产 ID || uint256 时间戳 || int256 量化价格)
+    if asset_id.startswith("0x") and len(asset_id) == 66:
+        asset_bytes = _hex_to_bytes(asset_id)
+    else:
+        asset_bytes = asset_id.encode('utf-8')
+    return keccak256(
+        _publisher_address(publisher_key)
+        + asset_bytes
+        + int(timestamp).to_bytes(32, 'big')
+        + (quantize_price(price) % (1 << 256)).to_bytes(32, 'big')
+    )
+
+def verify_signature_fields(fields: Tuple) -> Optional[bool]:
+    # fields: (publisher_key, asset_id, timestamp, price, msg_hash, r, s, v)
+    # 返回 None 表示无法判断: 缺少验证材料，或按本地约定重算的消息哈希与服务端不一致
+    # (哈希布局尚未用真实 /stork_signed_prices 数据核对过，不一致时不能断定数据无效)
+    publisher_key, asset_id, timestamp, price, msg_hash, r, s, v = fields
+    if not publisher_key or r is None or s is None or v is None:
+        return None
+    try:
+        expected_hash = price_message_hash(publisher_key, asset_id, timestamp, price)
+        if expected_hash != _hex_to_bytes(msg_hash):
+            return None
+        v = int(v, 16) if isinstance(v, str) else int(v)
+        recovered = recover_public_key(
+            eth_signed_digest(expected_hash),
+            int(r, 16) if isinstance(r, str) else int(r),
+            int(s, 16) if isinstance(s, str) else int(s),
+            v - 27 if v >= 27 else v
+        )
+        return recovered is not None and public_key_to_address(recovered) == _publisher_address(publisher_key)
+    except Exception:
+        return False
+
+def _verify_chunk(chunk: List[Tuple]) -> List[Optional[bool]]:
+    return [verify_signature_fields(fields) for fields in chunk]
+
+class SignatureVerifier:
+    def __init__(self, verify_config: Dict):
+        self.verify_config = verify_config
+        self._lock = threading.Lock()
+        self._results: "OrderedDict[Tuple, Optional[bool]]" = OrderedDict()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @staticmethod
+    def signature_fields(price_data: SignedPrice) -> Tuple:
+        r, s, v = price_data.signature or (None, None, None)
+        return (
+            price_data.publisher_key,
+            price_data.asset_id,
+            price_data.raw_timestamp,
+            price_data.price,
+            price_data.msg_hash,
+            r,
+            s,
+            v
+        )
+
+    def _remember(self, fields: Tuple, result: Optional[bool]):
+        self._results[fields] = result
+        self._results.move_to_end(fields)
+        while len(self._results) > self.verify_config["cache_size"]:
+            self._results.popitem(last=False)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.verify_config["processes"])
+        return self._pool
+
+    def verify_batch(self, prices: List[SignedPrice]) -> List[Optional[bool]]:
+        all_fields = [self.signature_fields(price) for price in prices]
+        results: Dict[Tuple, Optional[bool]] = {}
+        with self._lock:
+            for fields in all_fields:
+                if fields in self._results:
+                    results[fields] = self._results[fields]
+        pending = list(dict.fromkeys(f for f in all_fields if f not in results))
+        if pending:
+            processes = self.verify_config["processes"]
+            with cycle_profiler.section("validate"):
+                if processes > 0 and len(pending) >= self.verify_config["parallel_threshold"]:
+                    chunk_size = max(1, len(pending) // (processes * 4))
+                    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+                    verdicts = [v for chunk in self._executor().map(_verify_chunk, chunks) for v in chunk]
+                else:
+                    verdicts = _verify_chunk(pending)
+            with self._lock:
+                for fields, verdict in zip(pending, verdicts):
+                    results[fields] = verdict
+                    self._remember(fields, verdict)
+        return [results[fields] for fields in all_fields]
+
+    def verify(self, price_data: SignedPrice) -> Optional[bool]:
+        return self.verify_batch([price_data])[0]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+signature_verifier = SignatureVerifier(CONFIG["verify"])
+
+# pycognito 会连带导入 boto3/botocore，启动很慢，只在真正需要认证或刷新时才导入
+Cognito = None
+
+def load_cognito_class():
+    global Cognito
+    if Cognito is None:
+        from pycognito import Cognito as cognito_class
+        Cognito = cognito_class
+    return Cognito
 
 # 核心类
 class TokenHandler:
@@ -171,49 +1682,76 @@ class TokenHandler:
         self.username = username
         self.password = password
         self.config = config
-        self.cognito = Cognito(
-            user_pool_id=config["cognito"]["user_pool_id"],
-            client_id=config["cognito"]["client_id"],
-            user_pool_region=config["cognito"]["region"],
-            username=username
-        )
-        self.tokens = load_tokens()
+        self._cognito = None
+        self.tokens = load_tokens(username)
         self.access_token_value = None
         self.refresh_token_value = None
         self.id_token_value = None
+        # 由后台刷新调度器接管时，热路径只在令牌即将真正过期时才同步刷新
+        self.scheduled = False
+        self._refresh_lock = threading.Lock()
         self._initialize_tokens()
 
+    @property
+    def cognito(self):
+        if self._cognito is None:
+            self._cognito = load_cognito_class()(
+                user_pool_id=self.config["cognito"]["user_pool_id"],
+                client_id=self.config["cognito"]["client_id"],
+                user_pool_region=self.config["cognito"]["region"],
+                username=self.username
+            )
+            self._cognito.access_token = self.access_token_value
+            self._cognito.id_token = self.id_token_value
+        return self._cognito
+
+    @property
+    def expires_at(self) -> float:
+        return self.tokens.get("expires_at", 0) if self.tokens else 0
+
+    @staticmethod
+    def _token_expires_at(access_token: Optional[str]) -> float:
+        return jwt_expiry(access_token) or time.time() + 3600
+
     def _initialize_tokens(self):
         if self.tokens and all(key in self.tokens for key in ["access_token", "refresh_token", "id_token"]):
             if time.time() < self.tokens.get("expires_at", 0):
                 self.access_token_value = self.tokens["access_token"]
                 self.refresh_token_value = self.tokens["refresh_token"]
                 self.id_token_value = self.tokens["id_token"]
-                self.cognito.access_token = self.access_token_value
-                self.cognito.id_token = self.id_token_value
                 logger.info(f"{Fore.GREEN}加载的令牌有效")
                 return
-        logger.info(f"{Fore.BLUE}令牌无效或过期，开始认证")
+            # 访问令牌过期但刷新令牌仍在，走一次刷新即可，无需完整 SRP 认证
+            self.refresh_token_value = self.tokens["refresh_token"]
+            self.id_token_value = self.tokens["id_token"]
+            logger.info(f"{Fore.BLUE}令牌过期，使用刷新令牌续期")
+            self.refresh()
+            return
+        logger.info(f"{Fore.BLUE}令牌无效，开始认证")
         self.authenticate()
 
     def authenticate(self) -> Dict:
         try:
             logger.info(f"{Fore.BLUE}🔑 认证用户 {mask_email(self.username)}")
-            self.cognito.authenticate(password=self.password)
+            with metrics.timer("cognito_request_duration_seconds", operation="authenticate"), \
+                    cycle_profiler.section("cognito"):
+                self.cognito.authenticate(password=self.password)
             tokens = {
                 "access_token": self.cognito.access_token,
                 "refresh_token": self.cognito.refresh_token,
                 "id_token": self.cognito.id_token,
-                "expires_at": time.time() + 3600
+                "expires_at": self._token_expires_at(self.cognito.access_token)
             }
             self.access_token_value = tokens["access_token"]
             self.refresh_token_value = tokens["refresh_token"]
             self.id_token_value = tokens["id_token"]
-            save_tokens(tokens)
+            save_tokens(self.username, tokens)
             self.tokens = tokens
+            metrics.inc("token_refresh_total", kind="authenticate", result="success")
             logger.info(f"{Fore.GREEN}✅ 认证成功")
             return tokens
         except Exception as e:
+            metrics.inc("token_refresh_total", kind="authenticate", result="failure")
             logger.error(f"{Fore.RED}❌ 认证失败: {e}")
             raise
 
@@ -222,152 +1760,732 @@ class TokenHandler:
             logger.info(f"{Fore.BLUE}🔄 刷新令牌")
             if not self.refresh_token_value:
                 raise ValueError("无刷新令牌")
-            response = self.cognito.client.initiate_auth(
-                AuthFlow='REFRESH_TOKEN_AUTH',
-                AuthParameters={'REFRESH_TOKEN': self.refresh_token_value},
-                ClientId=self.config["cognito"]["client_id"]
-            )
+            with metrics.timer("cognito_request_duration_seconds", operation="refresh"), \
+                    cycle_profiler.section("cognito"):
+                response = self.cognito.client.initiate_auth(
+                    AuthFlow='REFRESH_TOKEN_AUTH',
+                    AuthParameters={'REFRESH_TOKEN': self.refresh_token_value},
+                    ClientId=self.config["cognito"]["client_id"]
+                )
             auth_result = response['AuthenticationResult']
             tokens = {
                 "access_token": auth_result['AccessToken'],
                 "refresh_token": self.refresh_token_value,
                 "id_token": auth_result.get('IdToken', self.id_token_value),
-                "expires_at": time.time() + 3600
+                "expires_at": self._token_expires_at(auth_result['AccessToken'])
             }
             self.access_token_value = tokens["access_token"]
             self.id_token_value = tokens["id_token"]
             self.cognito.access_token = self.access_token_value
             self.cognito.id_token = self.id_token_value
-            save_tokens(tokens)
+            save_tokens(self.username, tokens)
             self.tokens = tokens
+            metrics.inc("token_refresh_total", kind="refresh", result="success")
             logger.info(f"{Fore.GREEN}✅ 刷新成功")
             return tokens
         except Exception as e:
+            metrics.inc("token_refresh_total", kind="refresh", result="failure")
             logger.error(f"{Fore.RED}❌ 刷新失败: {e}")
             return self.authenticate()
 
-    def get_valid_token(self) -> str:
-        current_time = time.time()
-        expires_at = self.tokens.get("expires_at", 0) if self.tokens else 0
-        if current_time >= expires_at - 300:  # 提前 5 分钟刷新
+    def refresh_if_needed(self, margin: float) -> bool:
+        # 单飞: 并发调用方在锁上排队，拿到锁后若已被别人刷新则直接返回
+        if time.time() < self.expires_at - margin:
+            return False
+        with self._refresh_lock:
+            if time.time() < self.expires_at - margin:
+                return False
             logger.info(f"{Fore.YELLOW}令牌即将过期，刷新中...")
             if self.refresh_token_value:
                 self.refresh()
             else:
                 self.authenticate()
+            return True
+
+    def get_valid_token(self) -> str:
+        tokens_config = self.config["tokens"]
+        margin = tokens_config["min_validity_seconds"] if self.scheduled else tokens_config["refresh_lead_seconds"]
+        if time.time() >= self.expires_at - margin:
+            self.refresh_if_needed(margin)
         return self.access_token_value
 
-class StorkClient:
-    def __init__(self, config: Dict, token_handler: TokenHandler, use_proxy: bool, proxies_list: List[str]):
+# 后台令牌刷新: 按各账户过期时间 (减去提前量和随机抖动) 排队，到点在后台线程刷新
+class TokenRefreshScheduler:
+    def __init__(self, tokens_config: Dict):
+        self.tokens_config = tokens_config
+        self._cond = threading.Condition()
+        self._heap: List[Tuple[float, int, str, float]] = []
+        self._handlers: Dict[str, TokenHandler] = {}
+        self._generations: Dict[str, int] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def _due_time(self, handler: TokenHandler) -> Tuple[float, float]:
+        # 返回 (到期时间, 刷新提前量)；到点时按同一提前量刷新，抖动才真正生效
+        margin = self.tokens_config["refresh_lead_seconds"] + random.uniform(0, self.tokens_config["refresh_jitter_seconds"])
+        return max(time.time(), handler.expires_at - margin), margin
+
+    def _schedule(self, username: str, due: float, margin: float):
+        generation = self._generations.get(username, 0) + 1
+        self._generations[username] = generation
+        heapq.heappush(self._heap, (due, generation, username, margin))
+        self._cond.notify()
+
+    def register(self, handler: TokenHandler):
+        with self._cond:
+            handler.scheduled = True
+            self._handlers[handler.username] = handler
+            self._schedule(handler.username, *self._due_time(handler))
+
+    def unregister(self, username: str):
+        with self._cond:
+            handler = self._handlers.pop(username, None)
+            if handler:
+                handler.scheduled = False
+            self._generations.pop(username, None)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="token-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped and (not self._heap or self._heap[0][0] > time.time()):
+                    timeout = self._heap[0][0] - time.time() if self._heap else None
+                    self._cond.wait(timeout)
+                if self._stopped:
+                    return
+                _, generation, username, margin = heapq.heappop(self._heap)
+                handler = self._handlers.get(username)
+                if handler is None or self._generations.get(username) != generation:
+                    continue
+            try:
+                # 令牌若已在热路径上被刷新，expires_at 后移，这里不会重复刷新
+                handler.refresh_if_needed(margin)
+                due, margin = self._due_time(handler)
+            except Exception as e:
+                logger.error(f"{Fore.RED}后台刷新令牌失败 {mask_email(username)}: {e}")
+                due = time.time() + self.tokens_config["retry_seconds"]
+            with self._cond:
+                if self._handlers.get(username) is handler:
+                    self._schedule(username, due, margin)
+
+# 限流与重试: 每个接口一个令牌桶 (遇到 429 自动降速)、一个熔断器，GET 请求按去相关抖动退避重试
+class CircuitOpenError(Exception):
+    pass
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    def __init__(self, rate_config: Dict):
+        self.rate_config = rate_config
+        self.rate = rate_config["rate"]
+        self.tokens = float(rate_config["burst"])
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate_config["burst"], self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.rate_config["rate"], self.rate + self.rate_config["increase_step"])
+
+    def on_throttled(self, retry_after: Optional[float]):
+        with self._lock:
+            self.rate = max(self.rate_config["min_rate"], self.rate * self.rate_config["decrease_factor"])
+            self.tokens = 0.0
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+class CircuitBreaker:
+    def __init__(self, circuit_config: Dict):
+        self.circuit_config = circuit_config
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_request(self, endpoint: str) -> bool:
+        # 返回 True 表示本次请求持有半开状态下唯一的试探名额
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            remaining = self.opened_at + self.circuit_config["cooldown_seconds"] - time.monotonic()
+            if remaining > 0 or self.trial_in_flight:
+                raise CircuitOpenError(f"接口 {endpoint} 已熔断，{max(remaining, 0):.0f} 秒后重试")
+            # 半开: 放行一个试探请求
+            self.trial_in_flight = True
+            return True
+
+    def on_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def release_trial(self):
+        # 试探请求因与接口无关的原因中断 (非网络/HTTP 错误)，不计失败，只让出试探名额
+        with self._lock:
+            self.trial_in_flight = False
+
+    def on_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.circuit_config["failure_threshold"]:
+                self.opened_at = time.monotonic()
+
+class EndpointGuard:
+    def __init__(self, name: str, config: Dict):
+        self.name = name
+        self.retry_config = config["retry"]
+        self.bucket = TokenBucket(config["rate_limit"])
+        self.breaker = CircuitBreaker(config["circuit"])
+
+    def backoff_delays(self):
+        # 去相关抖动: sleep = min(cap, random(base, prev * 3))
+        base, cap = self.retry_config["base_delay"], self.retry_config["max_delay"]
+        delay = base
+        for _ in range(self.retry_config["max_attempts"] - 1):
+            delay = min(cap, random.uniform(base, delay * 3))
+            yield delay
+
+    def call(self, send, idempotent: bool) -> requests.Response:
+        delays = self.backoff_delays()
+        while True:
+            trial = self.breaker.before_request(self.name)
+            retry_after = None
+            response = None
+            try:
+                self.bucket.acquire()
+                response = send()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.breaker.on_failure()
+                error = e
+                retryable = idempotent
+            except BaseException:
+                # 只有持有试探名额的请求才能让出名额，否则会在另一个试探进行中再放行一个
+                if trial:
+                    self.breaker.release_trial()
+                raise
+            else:
+                if response.status_code == 429:
+                    # 被限流的请求服务端并未处理，POST 也可以安全重试
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    self.bucket.on_throttled(retry_after)
+                    error, retryable = None, True
+                elif response.status_code >= 500:
+                    self.breaker.on_failure()
+                    error, retryable = None, idempotent
+                else:
+                    if response.ok:
+                        self.bucket.on_success()
+                    self.breaker.on_success()
+                    return response
+            delay = next(delays, None)
+            if not retryable or delay is None:
+                if error is not None:
+                    raise error
+                return response
+            if response is not None:
+                # 丢弃的响应要先关闭，stream=True 时否则连接不会归还连接池
+                response.close()
+            delay = max(delay, retry_after or 0)
+            logger.warning(f"{Fore.YELLOW}接口 {self.name} 请求失败，{delay:.1f} 秒后重试")
+            time.sleep(delay)
+
+class EndpointGuards:
+    def __init__(self, config: Dict):
         self.config = config
+        self._guards: Dict[str, EndpointGuard] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> EndpointGuard:
+        with self._lock:
+            guard = self._guards.get(name)
+            if guard is None:
+                guard = self._guards[name] = EndpointGuard(name, self.config)
+            return guard
+
+endpoint_guards = EndpointGuards(CONFIG)
+
+class AsyncStorkClient:
+    def __init__(self, config: Dict, token_handler: TokenHandler, use_proxy: bool, proxies_list: List[str],
+                 max_concurrency: Optional[int] = None, transport: Optional[TransportRegistry] = None):
+        self.config = config
+        self.transport = transport or transports
+        self.guards = endpoint_guards
         self.token_handler = token_handler
         self.use_proxy = use_proxy
         self.proxies_list = proxies_list
+        self.max_concurrency = max_concurrency or config["threads"]["max_workers"]
         self.headers = {
             "Content-Type": "application/json",
             "User-Agent": config["stork"]["user_agent"],
             "Origin": config["stork"]["origin"]
         }
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop = None
+
+    def default_proxy(self) -> Optional[str]:
+        return self.proxies_list[0] if self.use_proxy and self.proxies_list else None
+
+    def proxy_for(self, index: int) -> Optional[str]:
+        return self.proxies_list[index % len(self.proxies_list)] if self.use_proxy and self.proxies_list else None
 
-    def get_signed_prices(self) -> List[Dict]:
+    def _request(self, method: str, path: str, proxy: Optional[str], headers: Optional[Dict] = None,
+                 **kwargs) -> requests.Response:
+        # 先取令牌再过熔断器: Cognito 故障不应占用或影响接口的熔断状态
         token = self.token_handler.get_valid_token()
-        session = requests.Session()
-        proxy = self.proxies_list[0] if self.use_proxy and self.proxies_list else None
+
+        def send() -> requests.Response:
+            status = "error"
+            try:
+                with metrics.timer("stork_request_duration_seconds", endpoint=path), cycle_profiler.section("http"):
+                    response = self.transport.request(
+                        method,
+                        f"{self.config['stork']['base_url']}{path}",
+                        proxy,
+                        headers={**self.headers, **(headers or {}), "Authorization": f"Bearer {token}"},
+                        **kwargs
+                    )
+                status = response.status_code
+                return response
+            finally:
+                metrics.inc("stork_requests_total", endpoint=path, status=status)
+
+        response = self.guards.get(path).call(send, idempotent=method == "GET")
+        if not response.ok:
+            response.close()
+            response.raise_for_status()
+        return response
+
+    # 同步实现 (在 I/O 线程中执行)
+    def stream_signed_prices(self, on_price: Callable[[SignedPrice], None]) -> int:
+        # 边下载边解析，每解析出一条记录立即回调，返回记录总数
+        proxy = self.default_proxy()
         if proxy:
-            if proxy.startswith("socks"):
-                session.mount("https://", SocksAdapter(proxy))
-            else:
-                session.proxies = {"https": proxy}
             logger.info(f"{Fore.BLUE}使用代理 {proxy} 获取价格")
         else:
             logger.info(f"{Fore.BLUE}直连获取价格")
         try:
-            response = session.get(
-                f"{self.config['stork']['base_url']}/stork_signed_prices",
-                headers={**self.headers, "Authorization": f"Bearer {token}"}
-            )
-            response.raise_for_status()
-            data = response.json()["data"]
-            prices = [
-                {
-                    "asset": key,
-                    "msg_hash": value["timestamped_signature"]["msg_hash"],
-                    "price": value["price"],
-                    "timestamp": value["timestamped_signature"]["timestamp"] / 1000000
-                }
-                for key, value in data.items()
-            ]
-            logger.info(f"{Fore.GREEN}✅ 获取 {len(prices)} 条价格数据")
-            return prices
+            count = 0
+            with self._request("GET", "/stork_signed_prices", proxy, stream=True) as response:
+                for price in iter_signed_prices(response.iter_content(chunk_size=65536)):
+                    on_price(price)
+                    count += 1
+            logger.info(f"{Fore.GREEN}✅ 获取 {count} 条价格数据")
+            return count
         except Exception as e:
             logger.error(f"{Fore.RED}❌ 获取价格失败: {e}")
             raise
 
-    def send_validation(self, msg_hash: str, is_valid: bool, proxy: Optional[str] = None):
-        token = self.token_handler.get_valid_token()
-        session = requests.Session()
-        if self.use_proxy and proxy:
-            if proxy.startswith("socks"):
-                session.mount("https://", SocksAdapter(proxy))
-            else:
-                session.proxies = {"https": proxy}
-            logger.info(f"{Fore.BLUE}使用代理 {proxy} 提交验证")
+    def fetch_signed_prices(self) -> List[SignedPrice]:
+        prices: List[SignedPrice] = []
+        self.stream_signed_prices(prices.append)
+        return prices
+
+    def fetch_price_snapshot(self, etag: Optional[str] = None, last_modified: Optional[str] = None
+                             ) -> Tuple[Optional[List[SignedPrice]], Optional[str], Optional[str]]:
+        # 条件请求: 服务端返回 304 时价格列表为 None
+        proxy = self.default_proxy()
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        try:
+            with self._request("GET", "/stork_signed_prices", proxy, headers=headers, stream=True) as response:
+                if response.status_code == 304:
+                    return None, etag, last_modified
+                prices = list(iter_signed_prices(response.iter_content(chunk_size=65536)))
+                logger.info(f"{Fore.GREEN}✅ 获取 {len(prices)} 条价格数据")
+                return prices, response.headers.get("ETag"), response.headers.get("Last-Modified")
+        except Exception as e:
+            logger.error(f"{Fore.RED}❌ 获取价格失败: {e}")
+            raise
+
+    def post_validation(self, msg_hash: str, is_valid: bool, proxy: Optional[str] = None):
+        proxy = proxy if self.use_proxy else None
+        if proxy:
+            logger.info(f"{Fore.BLUE}使用代理 {proxy} 提交验证", extra={"sample_key": "submit_route"})
         else:
-            logger.info(f"{Fore.BLUE}直连提交验证")
+            logger.info(f"{Fore.BLUE}直连提交验证", extra={"sample_key": "submit_route"})
         try:
-            response = session.post(
-                f"{self.config['stork']['base_url']}/stork_signed_prices/validations",
-                headers={**self.headers, "Authorization": f"Bearer {token}"},
+            self._request(
+                "POST", "/stork_signed_prices/validations", proxy,
                 json={"msg_hash": msg_hash, "valid": is_valid}
             )
-            response.raise_for_status()
-            logger.info(f"{Fore.GREEN}✅ 验证提交成功: {'有效' if is_valid else '无效'}")
+            logger.info(f"{Fore.GREEN}✅ 验证提交成功: {'有效' if is_valid else '无效'}", extra={"sample_key": "submit_ok"})
         except Exception as e:
             logger.error(f"{Fore.RED}❌ 验证提交失败: {e}")
             raise
 
-    def get_user_stats(self) -> Dict:
-        token = self.token_handler.get_valid_token()
-        session = requests.Session()
-        proxy = self.proxies_list[0] if self.use_proxy and self.proxies_list else None
+    def fetch_user_stats(self) -> Dict:
+        proxy = self.default_proxy()
         if proxy:
-            if proxy.startswith("socks"):
-                session.mount("https://", SocksAdapter(proxy))
-            else:
-                session.proxies = {"https": proxy}
             logger.info(f"{Fore.BLUE}使用代理 {proxy} 获取统计")
         else:
             logger.info(f"{Fore.BLUE}直连获取统计")
         try:
-            response = session.get(
-                f"{self.config['stork']['base_url']}/me",
-                headers={**self.headers, "Authorization": f"Bearer {token}"}
-            )
-            response.raise_for_status()
-            return response.json()["data"]
+            return self._request("GET", "/me", proxy).json()["data"]
         except Exception as e:
             logger.error(f"{Fore.RED}❌ 获取统计失败: {e}")
             raise
 
+    # 异步接口
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        async with self._semaphore:
+            return await asyncio.to_thread(func, *args)
+
+    async def get_signed_prices(self) -> List[SignedPrice]:
+        return await self._run(self.fetch_signed_prices)
+
+    async def get_price_snapshot(self, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        return await self._run(self.fetch_price_snapshot, etag, last_modified)
+
+    async def stream_prices(self, on_price: Callable[[SignedPrice], None]) -> int:
+        # 回调会因下游队列满而阻塞，所以下载放在独立线程里: 既不占并发信号量，也不占共享线程池，
+        # 否则下载线程占满线程池后验签/提交拿不到线程，队列永远不会被消费
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        context = contextvars.copy_context()
+
+        def settle(result=None, error: Optional[BaseException] = None):
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        def download():
+            try:
+                outcome = (context.run(self.stream_signed_prices, on_price), None)
+            except BaseException as e:
+                outcome = (None, e)
+            try:
+                loop.call_soon_threadsafe(settle, *outcome)
+            except RuntimeError:
+                # 事件循环已关闭，没有人在等结果
+                pass
+
+        threading.Thread(target=download, name="stork-stream", daemon=True).start()
+        return await future
+
+    async def send_validation(self, msg_hash: str, is_valid: bool, proxy: Optional[str] = None):
+        return await self._run(self.post_validation, msg_hash, is_valid, proxy)
+
+    async def get_user_stats(self) -> Dict:
+        return await self._run(self.fetch_user_stats)
+
+# 价格快照: 所有账户共享最近一次拉取的价格，短 TTL 内直接复用，过期后用 ETag / Last-Modified 做条件请求
+class PriceSnapshot:
+    __slots__ = ("prices", "hashes", "changed", "generation", "etag", "last_modified", "fetched_at")
+
+    def __init__(self, prices: List[SignedPrice], previous: Optional["PriceSnapshot"],
+                 etag: Optional[str], last_modified: Optional[str]):
+        self.prices = prices
+        self.hashes = {price.msg_hash for price in prices}
+        previous_hashes = previous.hashes if previous else set()
+        # 与上一份快照相比新出现的 msg_hash
+        self.changed = [price for price in prices if price.msg_hash not in previous_hashes]
+        self.generation = previous.generation + 1 if previous else 1
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = time.monotonic()
+
+class PriceSnapshotCache:
+    def __init__(self, snapshot_config: Dict):
+        self.snapshot_config = snapshot_config
+        self._snapshot: Optional[PriceSnapshot] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop = None
+        self._consumed: Dict[str, int] = {}
+
+    def _loop_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    async def get(self, client: "AsyncStorkClient") -> PriceSnapshot:
+        # 单飞: 并发的账户在锁上等待同一次拉取
+        async with self._loop_lock():
+            snapshot = self._snapshot
+            if snapshot and time.monotonic() - snapshot.fetched_at < self.snapshot_config["ttl_seconds"]:
+                return snapshot
+            prices, etag, last_modified = await client.get_price_snapshot(
+                snapshot.etag if snapshot else None,
+                snapshot.last_modified if snapshot else None
+            )
+            if prices is None and snapshot is not None:
+                snapshot.fetched_at = time.monotonic()
+                logger.info(f"{Fore.BLUE}价格快照未变化 (304)")
+                return snapshot
+            self._snapshot = PriceSnapshot(prices or [], snapshot, etag, last_modified)
+            logger.info(f"{Fore.BLUE}价格快照更新: {len(self._snapshot.prices)} 条，新增 {len(self._snapshot.changed)} 条")
+            return self._snapshot
+
+    def consumed_generation(self, username: str) -> Optional[int]:
+        return self._consumed.get(username)
+
+    def mark_consumed(self, username: str, generation: int):
+        self._consumed[username] = generation
+
+price_snapshots = PriceSnapshotCache(CONFIG["snapshot"])
+
+# 流水线: 拉取 -> 验签 -> 提交，各阶段通过有界队列连接，队列满时上游自动等待 (背压)
+class ValidationPipeline:
+    def __init__(self, client: AsyncStorkClient, username: str, account_count: int, pipeline_config: Dict):
+        self.client = client
+        self.username = username
+        self.account_count = account_count
+        self.pipeline_config = pipeline_config
+        self.fetched = 0
+        self.skipped = 0
+        self.results: List[Dict] = []
+        self.snapshot_generation: Optional[int] = None
+        self._aborted = False
+
+    async def _produce(self, verify_queue: asyncio.Queue):
+        if self.pipeline_config["use_snapshot"]:
+            await self._produce_from_snapshot(verify_queue)
+        else:
+            await self._produce_streaming(verify_queue)
+
+    async def _produce_from_snapshot(self, verify_queue: asyncio.Queue):
+        snapshot = await price_snapshots.get(self.client)
+        self.fetched = len(snapshot.prices)
+        submission_cache.resize(self.fetched, self.account_count)
+        self.snapshot_generation = snapshot.generation
+        consumed = price_snapshots.consumed_generation(self.username)
+        if consumed == snapshot.generation:
+            # 本账户已完整处理过这份快照，无需逐条比对
+            self.skipped = self.fetched
+            return
+        # 处理过上一份快照时只需比对增量
+        candidates = snapshot.changed if consumed == snapshot.generation - 1 else snapshot.prices
+        fresh_prices = await asyncio.to_thread(submission_cache.filter_new, self.username, candidates)
+        self.skipped = self.fetched - len(fresh_prices)
+        if self.skipped:
+            logger.info(f"{Fore.BLUE}跳过 {self.skipped} 条已提交的数据")
+        for price in fresh_prices:
+            await verify_queue.put(price)
+            metrics.set_gauge("pipeline_queue_depth", verify_queue.qsize(), stage="verify")
+
+    async def _produce_streaming(self, verify_queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+
+        # 在下载线程中回调: 每解析出一条就送入验签队列，队列满时阻塞下载 (背压)
+        def on_price(price: SignedPrice):
+            if self._aborted:
+                raise RuntimeError("流水线已中止")
+            if not submission_cache.filter_new(self.username, [price]):
+                self.skipped += 1
+                return
+            asyncio.run_coroutine_threadsafe(verify_queue.put(price), loop).result()
+            metrics.set_gauge("pipeline_queue_depth", verify_queue.qsize(), stage="verify")
+
+        self.fetched = await self.client.stream_prices(on_price)
+        submission_cache.resize(self.fetched, self.account_count)
+        if self.skipped:
+            logger.info(f"{Fore.BLUE}跳过 {self.skipped} 条已提交的数据")
+
+    async def _verify(self, verify_queue: asyncio.Queue, submit_queue: asyncio.Queue):
+        batch_size = self.pipeline_config["verify_batch"]
+        while True:
+            price = await verify_queue.get()
+            if price is None:
+                return
+            # 取到一条后顺带取走队列里已就绪的数据，凑成一批验签
+            batch = [price]
+            finished = False
+            while len(batch) < batch_size and not verify_queue.empty():
+                item = verify_queue.get_nowait()
+                if item is None:
+                    finished = True
+                    break
+                batch.append(item)
+            try:
+                await asyncio.to_thread(signature_verifier.verify_batch, batch)
+            except Exception as e:
+                logger.warning(f"{Fore.YELLOW}批量验签失败，改为逐条验证: {e}")
+            metrics.set_gauge("pipeline_queue_depth", verify_queue.qsize(), stage="verify")
+            for item in batch:
+                logger.info(f"{Fore.BLUE}验证资产: {item.asset}", extra={"sample_key": "verify_asset"})
+                try:
+                    is_valid = validate_price(item)
+                except Exception as e:
+                    logger.error(f"{Fore.RED}验证资产 {item.asset} 失败: {e}")
+                    self.results.append({"success": False, "msg_hash": item.msg_hash})
+                    metrics.inc("validations_total", result="failed")
+                    continue
+                await submit_queue.put((item, is_valid))
+                metrics.set_gauge("pipeline_queue_depth", submit_queue.qsize(), stage="submit")
+            if finished:
+                return
+
+    async def _submit(self, submit_queue: asyncio.Queue, worker_index: int):
+        while True:
+            item = await submit_queue.get()
+            if item is None:
+                return
+            price, is_valid = item
+            metrics.set_gauge("pipeline_queue_depth", submit_queue.qsize(), stage="submit")
+            run_journal.record_pending(self.username, price.msg_hash)
+            try:
+                await self.client.send_validation(price.msg_hash, is_valid, self.client.proxy_for(worker_index))
+                self.results.append({"success": True, "msg_hash": price.msg_hash, "valid": is_valid})
+                run_journal.record_result(self.username, price.msg_hash, True)
+                metrics.inc("validations_total", result="valid" if is_valid else "invalid")
+            except Exception as e:
+                logger.error(f"{Fore.RED}验证资产 {price.asset} 失败: {e}")
+                self.results.append({"success": False, "msg_hash": price.msg_hash})
+                run_journal.record_result(self.username, price.msg_hash, False)
+                metrics.inc("validations_total", result="failed")
+
+    @staticmethod
+    async def _wait_stage(stage: List[asyncio.Task], tasks: List[asyncio.Task]):
+        # 等待某一阶段结束，期间任何阶段的任务异常退出都立即抛出，避免其余阶段在满/空队列上永久等待
+        while not all(task.done() for task in stage):
+            pending = {task for task in tasks + stage if not task.done()}
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+
+    async def _put_sentinel(self, queue: asyncio.Queue, tasks: List[asyncio.Task]):
+        put = asyncio.create_task(queue.put(None))
+        try:
+            await self._wait_stage([put], tasks)
+        finally:
+            put.cancel()
+
+    async def run(self) -> List[Dict]:
+        queue_size = self.pipeline_config["queue_size"]
+        verify_workers = self.pipeline_config["verify_workers"]
+        submit_workers = self.pipeline_config["submit_workers"] or self.client.max_concurrency
+        verify_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        submit_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+        producer = asyncio.create_task(self._produce(verify_queue))
+        verifiers = [asyncio.create_task(self._verify(verify_queue, submit_queue)) for _ in range(verify_workers)]
+        submitters = [asyncio.create_task(self._submit(submit_queue, i)) for i in range(submit_workers)]
+        tasks = [producer] + verifiers + submitters
+        try:
+            await self._wait_stage([producer], tasks)
+            for _ in verifiers:
+                await self._put_sentinel(verify_queue, tasks)
+            await self._wait_stage(verifiers, tasks)
+            for _ in submitters:
+                await self._put_sentinel(submit_queue, tasks)
+            await self._wait_stage(submitters, tasks)
+        except BaseException:
+            # 任一阶段出错或被取消: 停掉全部阶段，并腾空验签队列，让阻塞在 put 上的下载线程能看到中止标记退出
+            self._aborted = True
+            for task in tasks:
+                task.cancel()
+            while not verify_queue.empty():
+                verify_queue.get_nowait()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            acknowledged = [r["msg_hash"] for r in self.results if r["success"]]
+            await asyncio.to_thread(submission_cache.mark_acknowledged, self.username, acknowledged)
+            run_journal.settle(self.username, acknowledged)
+        if self.snapshot_generation is not None and len(acknowledged) == len(self.results):
+            price_snapshots.mark_consumed(self.username, self.snapshot_generation)
+        return self.results
+
+# 同步接口，保持与旧调用方兼容，内部复用 AsyncStorkClient 的连接池
+class StorkClient:
+    def __init__(self, config: Dict, token_handler: TokenHandler, use_proxy: bool, proxies_list: List[str]):
+        self.engine = AsyncStorkClient(config, token_handler, use_proxy, proxies_list)
+        self.config = config
+        self.token_handler = token_handler
+        self.use_proxy = use_proxy
+        self.proxies_list = proxies_list
+        self.headers = self.engine.headers
+
+    def get_signed_prices(self) -> List[SignedPrice]:
+        return self.engine.fetch_signed_prices()
+
+    def send_validation(self, msg_hash: str, is_valid: bool, proxy: Optional[str] = None):
+        self.engine.post_validation(msg_hash, is_valid, proxy)
+
+    def get_user_stats(self) -> Dict:
+        return self.engine.fetch_user_stats()
+
 # 辅助函数
-def validate_price(price_data: Dict) -> bool:
-    if not all(k in price_data for k in ["msg_hash", "price", "timestamp"]):
-        logger.warning(f"{Fore.YELLOW}数据不完整: {price_data.get('asset', '未知')}")
+def validate_price(price_data: SignedPrice) -> bool:
+    with cycle_profiler.section("validate"):
+        return _validate_price(price_data)
+
+def _validate_price(price_data: SignedPrice) -> bool:
+    if price_data.msg_hash is None or price_data.price is None or price_data.timestamp is None:
+        logger.warning(f"{Fore.YELLOW}数据不完整: {price_data.asset}")
         return False
-    if (time.time() - price_data["timestamp"]) / 60 > 60:
-        logger.warning(f"{Fore.YELLOW}数据过期: {price_data['asset']}")
+    if (time.time() - price_data.timestamp) / 60 > 60:
+        logger.warning(f"{Fore.YELLOW}数据过期: {price_data.asset}")
         return False
-    return True
+    # 批量验证会预先填充缓存，这里通常直接命中；验签器本身出错时按无法验证处理
+    try:
+        verified = signature_verifier.verify(price_data)
+    except Exception as e:
+        logger.warning(f"{Fore.YELLOW}验签出错: {price_data.asset}: {e}")
+        verified = None
+    if verified is None:
+        if CONFIG["verify"]["require_signature"]:
+            logger.warning(f"{Fore.YELLOW}无法验证签名: {price_data.asset}")
+            return False
+        return True
+    if not verified:
+        logger.warning(f"{Fore.YELLOW}签名验证失败: {price_data.asset}")
+    return verified
 
-def worker_task(price_data: Dict, client: StorkClient, proxy: Optional[str]):
+def worker_task(price_data: SignedPrice, client: StorkClient, proxy: Optional[str]):
     try:
-        logger.info(f"{Fore.BLUE}验证资产: {price_data['asset']}")
+        logger.info(f"{Fore.BLUE}验证资产: {price_data.asset}", extra={"sample_key": "verify_asset"})
         is_valid = validate_price(price_data)
-        client.send_validation(price_data["msg_hash"], is_valid, proxy)
-        return {"success": True, "msg_hash": price_data["msg_hash"]}
+        client.send_validation(price_data.msg_hash, is_valid, proxy)
+        return {"success": True, "msg_hash": price_data.msg_hash}
     except Exception as e:
-        logger.error(f"{Fore.RED}验证资产 {price_data['asset']} 失败: {e}")
-        return {"success": False, "msg_hash": price_data["msg_hash"]}
+        logger.error(f"{Fore.RED}验证资产 {price_data.asset} 失败: {e}")
+        return {"success": False, "msg_hash": price_data.msg_hash}
 
 def display_stats(stats: Dict):
     if not stats or "stats" not in stats:
@@ -387,32 +2505,398 @@ def display_stats(stats: Dict):
 def log_current_ip(account: Dict, proxies_list: List[str], use_proxy: bool):
     proxy = proxies_list[0] if use_proxy and proxies_list else None
     try:
-        session = requests.Session()
         if proxy:
-            if proxy.startswith("socks"):
-                session.mount("https://", SocksAdapter(proxy))
-            else:
-                session.proxies = {"https": proxy}
             logger.info(f"{Fore.BLUE}使用代理 {proxy} 获取 IP")
         else:
             logger.info(f"{Fore.BLUE}直连获取 IP")
-        response = session.get("https://api.ipify.org?format=json", timeout=10)
+        response = transports.request("GET", "https://api.ipify.org?format=json", proxy, timeout=10)
         logger.info(f"{Fore.GREEN}账户 {mask_email(account['username'])} 当前 IP: {response.json()['ip']}")
     except Exception as e:
         logger.error(f"{Fore.RED}获取 IP 失败: {e}")
 
+# 用户统计: 缓存 /me 结果，过期后在后台刷新；提交后延迟核对服务端有效验证数与本地预期是否一致
+class UserStatsEntry:
+    __slots__ = ("stats", "fetched_at", "expected", "refresh_task", "reconcile_task", "mismatches",
+                 "in_flight", "cycles_started", "idle")
+
+    def __init__(self, stats: Dict):
+        self.stats = stats
+        self.fetched_at = time.monotonic()
+        self.expected = valid_count(stats)
+        self.refresh_task: Optional[asyncio.Task] = None
+        self.reconcile_task: Optional[asyncio.Task] = None
+        self.mismatches = 0
+        # 进行中的周期会产生尚未计入 expected 的提交，核对只在账户空闲时读取 /me
+        self.in_flight = 0
+        self.cycles_started = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+def valid_count(stats: Dict) -> int:
+    return int(stats.get("stats", {}).get("stork_signed_prices_valid_count", 0) or 0)
+
+class UserStatsTracker:
+    def __init__(self, stats_config: Dict):
+        self.stats_config = stats_config
+        self._entries: Dict[str, UserStatsEntry] = {}
+
+    def cached(self, username: str) -> Optional[Dict]:
+        entry = self._entries.get(username)
+        return entry.stats if entry else None
+
+    def expected(self, username: str) -> Optional[int]:
+        entry = self._entries.get(username)
+        return entry.expected if entry else None
+
+    def _update(self, entry: UserStatsEntry, stats: Dict):
+        entry.stats = stats
+        entry.fetched_at = time.monotonic()
+
+    async def prime(self, client: "AsyncStorkClient", username: str) -> Dict:
+        # 每个账户只在首次出现时同步拉取一次，作为核对的基准
+        entry = self._entries.get(username)
+        if entry is None:
+            entry = UserStatsEntry(await client.get_user_stats())
+            self._entries[username] = entry
+        elif time.monotonic() - entry.fetched_at >= self.stats_config["ttl_seconds"]:
+            self.refresh_in_background(client, username)
+        return entry.stats
+
+    def refresh_in_background(self, client: "AsyncStorkClient", username: str):
+        entry = self._entries.get(username)
+        if entry is None or entry.refresh_task or entry.reconcile_task:
+            return
+
+        async def refresh():
+            try:
+                self._update(entry, await client.get_user_stats())
+            except Exception as e:
+                logger.warning(f"{Fore.YELLOW}后台刷新统计失败: {e}")
+            finally:
+                entry.refresh_task = None
+
+        entry.refresh_task = create_detached_task(refresh())
+
+    def begin_cycle(self, username: str):
+        entry = self._entries.get(username)
+        if entry is None:
+            return
+        entry.in_flight += 1
+        entry.cycles_started += 1
+        entry.idle.clear()
+
+    def finish_cycle(self, client: "AsyncStorkClient", username: str, valid_submitted: int):
+        entry = self._entries.get(username)
+        if entry is None:
+            return
+        entry.in_flight -= 1
+        if entry.in_flight == 0:
+            entry.idle.set()
+        if valid_submitted <= 0:
+            return
+        entry.expected += valid_submitted
+        if entry.reconcile_task is None:
+            entry.reconcile_task = create_detached_task(self._reconcile(client, username, entry))
+
+    async def _reconcile(self, client: "AsyncStorkClient", username: str, entry: UserStatsEntry):
+        account = mask_username(username)
+        try:
+            while True:
+                # 服务端计数有延迟，等待一段时间后再核对此刻之前已记录的提交
+                target = entry.expected
+                await asyncio.sleep(self.stats_config["reconcile_delay_seconds"])
+                await entry.idle.wait()
+                cycles_started = entry.cycles_started
+                try:
+                    stats = await client.get_user_stats()
+                except Exception as e:
+                    logger.warning(f"{Fore.YELLOW}核对统计失败: {e}")
+                    continue
+                self._update(entry, stats)
+                if entry.cycles_started != cycles_started:
+                    # 读取期间有新周期开始，读数可能包含未记录的提交，下一轮再核对
+                    continue
+                observed = valid_count(stats)
+                drift = observed - target
+                metrics.set_gauge("stats_valid_count_drift", drift, account=account)
+                if drift < -self.stats_config["mismatch_tolerance"]:
+                    entry.mismatches += 1
+                    metrics.inc("stats_reconcile_mismatch_total", account=account)
+                    logger.warning(f"{Fore.YELLOW}⚠️ 账户 {mask_email(username)} 有效验证数不一致: "
+                                   f"预期 {target}，服务端 {observed}")
+                    # 确认丢失的部分不再计入预期
+                    entry.expected += drift
+                else:
+                    logger.info(f"{Fore.GREEN}账户 {mask_email(username)} 统计核对通过: 有效验证 {observed}")
+                # 读取时没有进行中的周期，服务端多出的计数来自本进程之外 (或未记录的失败周期)，以服务端为准
+                entry.expected = max(entry.expected, observed)
+                if entry.expected == target or entry.expected == observed:
+                    return
+        finally:
+            entry.reconcile_task = None
+
+    def mismatch_count(self) -> int:
+        return sum(entry.mismatches for entry in self._entries.values())
+
+    async def wait_reconciled(self):
+        tasks = [entry.reconcile_task for entry in self._entries.values() if entry.reconcile_task]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def cancel(self):
+        for entry in self._entries.values():
+            for task in (entry.refresh_task, entry.reconcile_task):
+                if task:
+                    task.cancel()
+
+user_stats = UserStatsTracker(CONFIG["stats"])
+
+# 账户上下文池: 每个账户的 TokenHandler (含 Cognito 客户端) 和 AsyncStorkClient 只构建一次并跨周期复用，
+# 只有账户密码变化时才重建
+class AccountContext:
+    __slots__ = ("username", "token_handler", "client")
+
+    def __init__(self, username: str, token_handler: TokenHandler, client: AsyncStorkClient):
+        self.username = username
+        self.token_handler = token_handler
+        self.client = client
+
+class AccountContextPool:
+    def __init__(self, config: Dict, use_proxy: bool, proxies_list: List[str], token_refresher: TokenRefreshScheduler):
+        self.config = config
+        self.use_proxy = use_proxy
+        self.proxies_list = proxies_list
+        self.token_refresher = token_refresher
+        self._contexts: Dict[str, AccountContext] = {}
+
+    def __len__(self) -> int:
+        return len(self._contexts)
+
+    async def acquire(self, account: Dict) -> AccountContext:
+        username = account["username"]
+        context = self._contexts.get(username)
+        if context is not None:
+            if hmac.compare_digest(context.token_handler.password.encode(), account["password"].encode()):
+                return context
+            logger.info(f"{Fore.BLUE}账户 {mask_email(username)} 凭据已变化，重建上下文")
+            self.discard(username)
+        token_handler = await asyncio.to_thread(TokenHandler, username, account["password"], self.config)
+        self.token_refresher.register(token_handler)
+        context = AccountContext(username, token_handler,
+                                 AsyncStorkClient(self.config, token_handler, self.use_proxy, self.proxies_list))
+        self._contexts[username] = context
+        return context
+
+    def discard(self, username: str):
+        if self._contexts.pop(username, None) is not None:
+            self.token_refresher.unregister(username)
+
+    def close(self):
+        for username in list(self._contexts):
+            self.discard(username)
+
+# 账户调度: 按每个账户的下次到期时间维护小顶堆，到点即派发，空闲时只等待最近的截止时间
+class AccountScheduler:
+    def __init__(self, accounts_list: List[Dict], scheduler_config: Dict, default_interval: float):
+        self.accounts_list = accounts_list
+        self.scheduler_config = scheduler_config
+        self.default_interval = default_interval
+        self.lag: Dict[str, float] = {}
+        self._heap: List[Tuple[float, int, int]] = []
+        self._seq = 0
+        self._wakeup = asyncio.Event()
+
+    def interval_for(self, account: Dict) -> float:
+        return self.scheduler_config["account_intervals"].get(account["username"], self.default_interval)
+
+    def _push(self, due: float, index: int):
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, index))
+        self._wakeup.set()
+
+    def lag_report(self) -> Dict[str, float]:
+        return dict(self.lag)
+
+    async def _dispatch(self, index: int, due: float, process_account, slots: asyncio.Semaphore):
+        account = self.accounts_list[index]
+        async with slots:
+            started_at = time.monotonic()
+            lag = max(0.0, started_at - due)
+            self.lag[account["username"]] = lag
+            metrics.set_gauge("account_schedule_lag_seconds", lag, account=mask_username(account["username"]))
+            if lag > self.scheduler_config["lag_warning_seconds"]:
+                logger.warning(f"{Fore.YELLOW}账户 {mask_email(account['username'])} 落后计划 {lag:.1f} 秒")
+            try:
+                await process_account(account)
+                next_due = started_at + self.interval_for(account)
+            except Exception as e:
+                logger.error(f"{Fore.RED}账户 {mask_email(account['username'])} 验证流程出错: {e}")
+                next_due = time.monotonic() + self.scheduler_config["error_backoff_seconds"]
+            metrics.observe("account_cycle_duration_seconds", time.monotonic() - started_at)
+        self._push(next_due, index)
+
+    async def run(self, process_account, last_completed: Optional[Dict[str, float]] = None):
+        slots = asyncio.Semaphore(self.scheduler_config["max_parallel_accounts"])
+        now = time.monotonic()
+        wall_now = time.time()
+        for index, account in enumerate(self.accounts_list):
+            # 重启后按上次完成时间续排，刚跑完的账户不会立即再跑一轮
+            completed_at = (last_completed or {}).get(account["username"])
+            delay = completed_at + self.interval_for(account) - wall_now if completed_at else 0
+            self._push(now + min(max(0.0, delay), self.interval_for(account)), index)
+        running = set()
+        while True:
+            self._wakeup.clear()
+            while self._heap and self._heap[0][0] <= time.monotonic():
+                due, _, index = heapq.heappop(self._heap)
+                task = asyncio.create_task(self._dispatch(index, due, process_account, slots))
+                running.add(task)
+                task.add_done_callback(running.discard)
+            timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
 # 主逻辑
-def main():
-    print(get_banner_text())
-    logger.info(f"{Fore.MAGENTA}🚀 系统初始化中...")
+async def run_account_cycle(account: Dict, account_count: int, contexts: AccountContextPool):
+    logger.info(f"{Fore.MAGENTA}处理账户: {mask_email(account['username'])}")
+    if CONFIG["stork"]["log_ip"]:
+        await asyncio.to_thread(log_current_ip, account, contexts.proxies_list, contexts.use_proxy)
+
+    stork_client = (await contexts.acquire(account)).client
+
+    logger.info(f"{Fore.CYAN}───── 开始验证流程 ─────")
+    display_stats(await user_stats.prime(stork_client, account["username"]))
+
+    pipeline = ValidationPipeline(stork_client, account["username"], account_count, CONFIG["pipeline"])
+    user_stats.begin_cycle(account["username"])
+    try:
+        results = await pipeline.run()
+    finally:
+        # 服务端计数不再当场等待，交给后台核对
+        user_stats.finish_cycle(stork_client, account["username"],
+                                sum(1 for r in pipeline.results if r["success"] and r.get("valid")))
+    if not results:
+        logger.info(f"{Fore.YELLOW}无新数据可验证")
+        run_journal.record_cycle(account["username"])
+        return
+
+    success_count = sum(1 for r in results if r["success"])
+    logger.info(f"{Fore.GREEN}完成 {success_count}/{len(results)} 条验证 (获取 {pipeline.fetched} 条，跳过 {pipeline.skipped} 条)")
+    stork_client.transport.log_stats()
+    run_journal.record_cycle(account["username"])
 
+async def run_bot(accounts_list: List[Dict], proxies_list: List[str], use_proxy: bool):
+    max_workers = CONFIG["threads"]["max_workers"]
+    # 所有阻塞 I/O 共用一个线程池，协程并发数由 AsyncStorkClient 的信号量限制
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stork-io")
+    )
+    token_refresher = TokenRefreshScheduler(CONFIG["tokens"])
+    token_refresher.start()
+    contexts = AccountContextPool(CONFIG, use_proxy, proxies_list, token_refresher)
+    metrics.start_server()
+    cycle_profiler.start()
+
+    async def process_account(account: Dict):
+        try:
+            async with cycle_profiler.cycle(account["username"]):
+                await run_account_cycle(account, len(accounts_list), contexts)
+        except CircuitOpenError as e:
+            # 单个接口熔断只影响当前账户本轮，按正常间隔重新排期
+            logger.warning(f"{Fore.YELLOW}{e}，跳过账户 {mask_email(account['username'])}")
+
+    last_completed = await asyncio.to_thread(run_journal.replay)
+    scheduler = AccountScheduler(accounts_list, CONFIG["scheduler"], CONFIG["stork"]["interval_seconds"])
+    try:
+        await scheduler.run(process_account, last_completed)
+    finally:
+        user_stats.cancel()
+        contexts.close()
+        token_refresher.stop()
+        metrics.stop_server()
+        cycle_profiler.stop()
+
+def merge_config(base: Dict, overrides: Dict):
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            merge_config(base[key], value)
+        else:
+            base[key] = value
+
+def load_config_file(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        merge_config(CONFIG, json.load(f))
+    logger.info(f"{Fore.GREEN}已加载配置文件 {path}")
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Stork 自动验证机器人")
+    parser.add_argument("--config", help="JSON 配置文件，按层级覆盖内置 CONFIG")
+    proxy_group = parser.add_mutually_exclusive_group()
+    proxy_group.add_argument("--proxy", dest="use_proxy", action="store_true", default=None, help="使用代理")
+    proxy_group.add_argument("--no-proxy", dest="use_proxy", action="store_false", help="直连运行")
+    parser.add_argument("--headless", action="store_true", help="非交互模式，不询问任何输入")
+    parser.add_argument("--accounts-file", help=f"账户文件，默认 {ACCOUNTS_PATH}")
+    parser.add_argument("--proxies-file", help=f"代理文件，默认 {PROXIES_PATH}")
+    parser.add_argument("--max-workers", type=int, help="I/O 并发数 (默认 1)")
+    parser.add_argument("--log-format", choices=["auto", "color", "line", "json"], help="日志格式")
+    parser.add_argument("--sync-log", action="store_true", help="在调用线程中同步写日志")
+    parser.add_argument("--metrics-port", type=int, help="启用指标接口并监听此端口")
+    parser.add_argument("--profile", action="store_true", help="按周期采样剖析 CPU 热点和内存分配")
+    parser.add_argument("--profile-every", type=int, help="每隔多少个账户周期剖析一次")
+    parser.add_argument("--profile-interval-ms", type=int, help="调用栈采样间隔 (毫秒)")
+    parser.add_argument("--profile-dir", help="剖析结果输出目录")
+    return parser.parse_args(argv)
+
+def ask_use_proxy() -> bool:
     while True:
         use_proxy_input = input(f"{Fore.BLUE}[?] 是否使用代理？(y/n): ").strip().lower()
         if use_proxy_input in ['y', 'n']:
-            use_proxy = use_proxy_input == 'y'
-            break
+            return use_proxy_input == 'y'
         logger.warning(f"{Fore.YELLOW}⚠️ 请输入 'y' 或 'n'")
 
+def main(argv: Optional[List[str]] = None):
+    global ACCOUNTS_PATH, PROXIES_PATH
+    args = parse_args(argv)
+    headless = args.headless or not sys.stdin.isatty()
+    if args.config:
+        load_config_file(args.config)
+        metrics.enabled = CONFIG["metrics"]["enabled"]
+    if args.log_format:
+        CONFIG["logging"]["format"] = args.log_format
+    if args.sync_log:
+        CONFIG["logging"]["async"] = False
+    configure_logging(CONFIG["logging"])
+
+    if not headless:
+        print(get_banner_text())
+    logger.info(f"{Fore.MAGENTA}🚀 系统初始化中...")
+
+    if args.accounts_file:
+        ACCOUNTS_PATH = args.accounts_file
+    if args.proxies_file:
+        PROXIES_PATH = args.proxies_file
+    if args.max_workers:
+        CONFIG["threads"]["max_workers"] = args.max_workers
+    if args.metrics_port:
+        CONFIG["metrics"]["port"] = args.metrics_port
+        metrics.enabled = True
+    if args.profile:
+        CONFIG["profile"]["enabled"] = True
+    if args.profile_every:
+        CONFIG["profile"]["every_n_cycles"] = args.profile_every
+    if args.profile_interval_ms:
+        CONFIG["profile"]["sample_interval_ms"] = args.profile_interval_ms
+    if args.profile_dir:
+        CONFIG["profile"]["output_dir"] = args.profile_dir
+
+    use_proxy = args.use_proxy
+    if use_proxy is None:
+        use_proxy = CONFIG["run"]["use_proxy"]
+    if use_proxy is None:
+        use_proxy = False if headless else ask_use_proxy()
+
     accounts_list = load_accounts()
     if not accounts_list:
         logger.error(f"{Fore.RED}无有效账户，程序退出")
@@ -423,62 +2907,14 @@ def main():
         logger.warning(f"{Fore.YELLOW}代理列表为空，将直连运行")
         use_proxy = False
 
-    account_index = 0
-    max_workers = CONFIG["threads"]["max_workers"]
-
-    while True:
-        if account_index >= len(accounts_list):
-            account_index = 0
-            time.sleep(CONFIG["stork"]["interval_seconds"])
-            continue
-
-        account = accounts_list[account_index]
-        logger.info(f"{Fore.MAGENTA}处理账户: {mask_email(account['username'])}")
-        log_current_ip(account, proxies_list, use_proxy)
-
-        token_handler = TokenHandler(account["username"], account["password"], CONFIG)
-        stork_client = StorkClient(CONFIG, token_handler, use_proxy, proxies_list)
-
-        try:
-            logger.info(f"{Fore.CYAN}───── 开始验证流程 ─────")
-            initial_stats = stork_client.get_user_stats()
-            display_stats(initial_stats)
-            initial_count = initial_stats['stats'].get('stork_signed_prices_valid_count', 0)
-
-            prices = stork_client.get_signed_prices()
-            if not prices:
-                logger.info(f"{Fore.YELLOW}无新数据可验证")
-                display_stats(stork_client.get_user_stats())
-                account_index += 1
-                time.sleep(CONFIG["stork"]["interval_seconds"])
-                continue
-
-            logger.info(f"{Fore.BLUE}处理 {len(prices)} 条数据，线程数: {max_workers}")
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = [
-                    executor.submit(
-                        worker_task,
-                        price,
-                        stork_client,
-                        proxies_list[i % len(proxies_list)] if use_proxy and proxies_list else None
-                    )
-                    for i, price in enumerate(prices)
-                ]
-                results = [f.result() for f in futures]
-                success_count = sum(1 for r in results if r["success"])
-                logger.info(f"{Fore.GREEN}完成 {success_count}/{len(results)} 条验证")
-
-            time.sleep(30)
-            final_stats = stork_client.get_user_stats()
-            final_count = final_stats['stats'].get('stork_signed_prices_valid_count', 0)
-            logger.info(f"{Fore.GREEN}验证前后变化: {initial_count} -> {final_count}")
-            display_stats(final_stats)
-
-            account_index += 1
-            time.sleep(CONFIG["stork"]["interval_seconds"])
-        except Exception as e:
-            logger.error(f"{Fore.RED}验证流程出错: {e}")
-            time.sleep(60)
+    try:
+        asyncio.run(run_bot(accounts_list, proxies_list, use_proxy))
+    finally:
+        transports.close()
+        token_store.close()
+        signature_verifier.close()
+        submission_cache.close()
+        run_journal.close()
 
 if __name__ == "__main__":
     try:
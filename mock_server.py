@@ -0,0 +1,317 @@
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+import bot
+from bot import eth_signed_digest, price_message_hash, public_key_to_address
+
+# 本地模拟 Stork API: /me、/stork_signed_prices、/stork_signed_prices/validations
+# 价格数据用本地生成的密钥签名，机器人侧的签名验证可以正常通过
+
+# 签名只用于本地模拟数据，不属于机器人本身: 优先用 coincurve，否则用 bot 的曲线运算加 RFC 6979 确定性 nonce
+def _public_key(private_key: int) -> bytes:
+    if bot._coincurve is not None:
+        return bot._coincurve.PrivateKey(private_key.to_bytes(32, 'big')).public_key.format(compressed=False)[1:]
+    point = bot._jacobian_multiply_sum(private_key, bot._SECP256K1_G, 0, (0, 0, 0))
+    return bot._public_key_bytes(bot._to_affine(point))
+
+def private_key_to_address(private_key: int) -> bytes:
+    return public_key_to_address(_public_key(private_key))
+
+def _rfc6979_nonces(private_key: int, digest: bytes):
+    N = bot._SECP256K1_N
+    x = private_key.to_bytes(32, 'big')
+    h = (int.from_bytes(digest, 'big') % N).to_bytes(32, 'big')
+    v, k = b'\x01' * 32, b'\x00' * 32
+    k = hmac.new(k, v + b'\x00' + x + h, hashlib.sha256).digest()
+    v = hmac.new(k, v, hashlib.sha256).digest()
+    k = hmac.new(k, v + b'\x01' + x + h, hashlib.sha256).digest()
+    v = hmac.new(k, v, hashlib.sha256).digest()
+    while True:
+        v = hmac.new(k, v, hashlib.sha256).digest()
+        candidate = int.from_bytes(v, 'big')
+        if 0 < candidate < N:
+            yield candidate
+        k = hmac.new(k, v + b'\x00', hashlib.sha256).digest()
+        v = hmac.new(k, v, hashlib.sha256).digest()
+
+def sign_digest(private_key: int, digest: bytes) -> Tuple[int, int, int]:
+    # 返回低 s 规范化后的 (r, s, v)
+    if bot._coincurve is not None:
+        signature = bot._coincurve.PrivateKey(private_key.to_bytes(32, 'big')).sign_recoverable(digest, hasher=None)
+        return int.from_bytes(signature[:32], 'big'), int.from_bytes(signature[32:64], 'big'), 27 + signature[64]
+    N = bot._SECP256K1_N
+    z = int.from_bytes(digest, 'big')
+    for k in _rfc6979_nonces(private_key, digest):
+        rx, ry = bot._to_affine(bot._jacobian_multiply_sum(k, bot._SECP256K1_G, 0, (0, 0, 0)))
+        r = rx % N
+        s = pow(k, -1, N) * (z + r * private_key) % N
+        if not r or not s or rx >= N:
+            continue
+        recovery_id = ry & 1
+        if s > N // 2:
+            s = N - s
+            recovery_id ^= 1
+        return r, s, 27 + recovery_id
+
+def sign_price(private_key: int, asset_id: str, timestamp: int, price) -> Dict:
+    publisher_key = "0x" + private_key_to_address(private_key).hex()
+    msg_hash = price_message_hash(publisher_key, asset_id, timestamp, price)
+    r, s, v = sign_digest(private_key, eth_signed_digest(msg_hash))
+    return {
+        "publisher_key": publisher_key,
+        "msg_hash": "0x" + msg_hash.hex(),
+        "signature": {"r": hex(r), "s": hex(s), "v": hex(v)}
+    }
+
+class MockStorkState:
+    def __init__(self, assets: int, rotate_seconds: float, latency_ms: float, jitter_ms: float,
+                 error_rate: float, throttle_rate: float, seed: Optional[int] = None):
+        self.assets = assets
+        self.rotate_seconds = rotate_seconds
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.private_key = self.random.randrange(1, 2 ** 255)
+        self.lock = threading.Lock()
+        self.snapshot = b'{"data": {}}'
+        self.generation = 0
+        self.etag = '"0"'
+        self.last_modified = ""
+        self.known_hashes = set()
+        self.valid_count: Dict[str, int] = {}
+        self.invalid_count: Dict[str, int] = {}
+        self.last_verified: Dict[str, str] = {}
+        self.requests: Dict[str, int] = {}
+        self.rotate()
+
+    def rotate(self):
+        timestamp = time.time_ns()
+        data = {}
+        hashes = set()
+        for i in range(self.assets):
+            asset = f"ASSET{i}USD"
+            price = str(self.random.randrange(10 ** 18, 10 ** 24))
+            signed = sign_price(self.private_key, asset, timestamp, price)
+            data[asset] = {
+                "price": price,
+                "asset_id": asset,
+                "publisher_key": signed["publisher_key"],
+                "timestamped_signature": {
+                    "signature": signed["signature"],
+                    "timestamp": timestamp,
+                    "msg_hash": signed["msg_hash"]
+                }
+            }
+            hashes.add(signed["msg_hash"])
+        snapshot = json.dumps({"data": data}).encode()
+        with self.lock:
+            self.snapshot = snapshot
+            self.known_hashes |= hashes
+            self.generation += 1
+            self.etag = f'"{self.generation}"'
+            self.last_modified = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime())
+
+    def rotate_forever(self, stop: threading.Event):
+        while not stop.wait(self.rotate_seconds):
+            self.rotate()
+
+    def count(self, path: str):
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+def user_from_token(header: Optional[str]) -> str:
+    # StubCognito 签发的访问令牌载荷中带有 username
+    try:
+        payload = header.split(" ", 1)[1].split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload))["username"]
+    except Exception:
+        return "unknown@example.com"
+
+class MockStorkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: MockStorkState = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status: int, body: bytes, headers: Optional[Dict] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate(self) -> bool:
+        state = self.state
+        delay = max(0.0, state.latency_ms + state.random.uniform(-state.jitter_ms, state.jitter_ms))
+        time.sleep(delay / 1000)
+        roll = state.random.random()
+        if roll < state.throttle_rate:
+            self._send_json(429, b'{"error": "too many requests"}', {"Retry-After": "1"})
+            return False
+        if roll < state.throttle_rate + state.error_rate:
+            self._send_json(500, b'{"error": "internal error"}')
+            return False
+        return True
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        self.state.count(f"GET {path}")
+        if not self._simulate():
+            return
+        if path == "/v1/stork_signed_prices":
+            with self.state.lock:
+                body, etag, last_modified = self.state.snapshot, self.state.etag, self.state.last_modified
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self._send_json(200, body, {"ETag": etag, "Last-Modified": last_modified})
+        elif path == "/v1/me":
+            user = user_from_token(self.headers.get("Authorization"))
+            with self.state.lock:
+                stats = {
+                    "stork_signed_prices_valid_count": self.state.valid_count.get(user, 0),
+                    "stork_signed_prices_invalid_count": self.state.invalid_count.get(user, 0),
+                    "stork_signed_prices_last_verified_at": self.state.last_verified.get(user, "从未")
+                }
+            self._send_json(200, json.dumps({"data": {"email": user, "stats": stats}}).encode())
+        else:
+            self._send_json(404, b'{"error": "not found"}')
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0]
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        self.state.count(f"POST {path}")
+        if not self._simulate():
+            return
+        if path != "/v1/stork_signed_prices/validations":
+            self._send_json(404, b'{"error": "not found"}')
+            return
+        try:
+            payload = json.loads(body)
+            msg_hash, valid = payload["msg_hash"], payload["valid"]
+        except (ValueError, KeyError):
+            self._send_json(400, b'{"error": "bad request"}')
+            return
+        user = user_from_token(self.headers.get("Authorization"))
+        with self.state.lock:
+            counts = self.state.valid_count if valid and msg_hash in self.state.known_hashes else self.state.invalid_count
+            counts[user] = counts.get(user, 0) + 1
+            self.state.last_verified[user] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        self._send_json(201, b'{"message": "ok"}')
+
+class MockStorkServer:
+    def __init__(self, state: MockStorkState, host: str = "127.0.0.1", port: int = 0):
+        handler = type("BoundMockStorkHandler", (MockStorkHandler,), {"state": state})
+        self.state = state
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._stop = threading.Event()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name="mock-stork", daemon=True).start()
+        if self.state.rotate_seconds > 0:
+            threading.Thread(target=self.state.rotate_forever, args=(self._stop,), name="mock-rotate", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+# 模拟 Cognito: 替换 pycognito.Cognito，只实现 TokenHandler 用到的接口，并统计认证/刷新次数
+class StubCognito:
+    lock = threading.Lock()
+    instances = 0
+    auth_calls = 0
+    refresh_calls = 0
+    latency_ms = 0.0
+    token_ttl = 3600
+
+    def __init__(self, user_pool_id, client_id, user_pool_region=None, username=None, **kwargs):
+        self.username = username
+        self.access_token = None
+        self.id_token = None
+        self.refresh_token = None
+        self.client = self
+        with StubCognito.lock:
+            StubCognito.instances += 1
+
+    @classmethod
+    def reset(cls):
+        with cls.lock:
+            cls.instances = 0
+            cls.auth_calls = 0
+            cls.refresh_calls = 0
+
+    @classmethod
+    def issue_token(cls, username: str, token_use: str) -> str:
+        def encode(obj: Dict) -> str:
+            return base64.urlsafe_b64encode(json.dumps(obj).encode()).decode().rstrip("=")
+        claims = {"username": username, "token_use": token_use, "exp": int(time.time() + cls.token_ttl)}
+        return f"{encode({'alg': 'none'})}.{encode(claims)}.stub"
+
+    def authenticate(self, password: str):
+        time.sleep(self.latency_ms / 1000)
+        with StubCognito.lock:
+            StubCognito.auth_calls += 1
+        self.access_token = self.issue_token(self.username, "access")
+        self.id_token = self.issue_token(self.username, "id")
+        self.refresh_token = f"refresh-{self.username}"
+
+    def initiate_auth(self, AuthFlow: str, AuthParameters: Dict, ClientId: str) -> Dict:
+        time.sleep(self.latency_ms / 1000)
+        with StubCognito.lock:
+            StubCognito.refresh_calls += 1
+        username = AuthParameters["REFRESH_TOKEN"].split("-", 1)[1]
+        return {"AuthenticationResult": {
+            "AccessToken": self.issue_token(username, "access"),
+            "IdToken": self.issue_token(username, "id")
+        }}
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 Stork API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--assets", type=int, default=20)
+    parser.add_argument("--rotate-seconds", type=float, default=5.0)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    state = MockStorkState(args.assets, args.rotate_seconds, args.latency_ms, args.jitter_ms,
+                           args.error_rate, args.throttle_rate)
+    server = MockStorkServer(state, args.host, args.port)
+    server.start()
+    print(f"模拟 Stork API 已启动: {server.base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()